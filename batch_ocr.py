@@ -0,0 +1,396 @@
+"""Headless batch OCR for PDF files and directories of PDFs.
+
+Runs the same pipeline as the desktop app without PyQt5. Pages from all
+documents share one bounded worker pool; each page is written to the output as
+a JSON line as soon as it completes, and a per-document summary is written at
+the end.
+
+Every page's outcome is also recorded in the document's job manifest (see
+ocr_jobs), so an interrupted run can be picked up again with --resume, failed
+pages retried with --retry-failed and a page range re-run with --pages.
+With --export-dir each document is also written out (plain text, JSON lines
+or a searchable PDF) page by page as its pages complete, and with --index the
+text goes into the search index that ocr_search.py and the app query.
+
+    python batch_ocr.py scans/ extra.pdf --concurrency 8 --output pages.jsonl --summary summary.json
+    python batch_ocr.py scans/ --resume --output rest.jsonl
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import fitz  # PyMuPDF
+
+from ocr_pipeline import (COLOR_MODES, DEFAULT_OCR_BATCH_PAGES, DEFAULT_OCR_CONCURRENCY, DEFAULT_OCR_DPI,
+                          MAX_OCR_BATCH_PAGES, MAX_OCR_DPI, OCR_CACHE_DIR, OCRCache, PagePreprocessor, ocr_pages)
+from ocr_backends import (BACKENDS, CLIENT_SECRET_FILE, DRIVE_REQUEST_RATE, MAX_ATTEMPTS, TOKEN_FILE, DriveSession,
+                          RequestScheduler, create_backend)
+from ocr_export import EXPORT_FORMATS, create_exporter
+from ocr_jobs import JOB_FAILED, JOB_PENDING, JOBS_DIR, JobManifest, file_key, parse_page_range
+from ocr_metrics import metrics
+from ocr_search import SEARCH_INDEX_PATH, SearchIndex
+
+logger = logging.getLogger('batch_ocr')
+
+# Batches submitted to the worker pool ahead of the workers, per worker. More
+# would only queue up work that an interrupted run has to wait for.
+SUBMIT_AHEAD = 2
+
+def find_pdfs(paths):
+    """Expand files and directories (recursively) into a sorted list of PDF paths."""
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                found.extend(os.path.join(root, name) for name in files if name.lower().endswith('.pdf'))
+        elif os.path.isfile(path):
+            found.append(path)
+        else:
+            logger.warning(f"Skipping {path}: not a file or directory")
+    return sorted(set(found))
+
+class DocumentJob:
+    """One input document and its running totals."""
+
+    def __init__(self, path):
+        self.path = path
+        self.doc = None
+        self.page_count = 0
+        self.remaining = 0
+        self.succeeded = 0
+        self.cached = 0
+        self.native = 0
+        self.image_bytes = 0
+        self.unreduced_image_bytes = 0
+        self.failed_pages = []
+        self.page_nums = []  # pages to OCR in this run
+        self.restored = {}  # page -> text of pages already done in an earlier run
+        self.key = None  # SHA-256 of the PDF, once needed
+        self.manifest = None
+        self.exporter = None
+        self.search_index = None
+        self.search_id = None  # the document's id in search_index
+        self.error = None
+        self.seconds = 0.0
+        # PyMuPDF documents are not thread-safe; pages of one document render one at a time.
+        self.lock = threading.Lock()
+
+    def open(self, pages=None, jobs_dir=None, resume=False, retry_failed=False):
+        """Open the document and choose its pages: all or ``pages`` (a range spec), less those already done."""
+        try:
+            self.doc = fitz.open(self.path)
+            self.page_count = len(self.doc)
+            self.page_nums = parse_page_range(pages, self.page_count) if pages else list(range(self.page_count))
+            if jobs_dir:
+                self.key = file_key(self.path)
+                self.manifest = JobManifest(self.key, self.page_count, self.path, jobs_dir)
+        except Exception as e:
+            self.error = f"Could not open document: {str(e)}"
+            self.close()
+            return
+        if self.manifest is not None:
+            if resume or retry_failed:
+                wanted = set(self.manifest.pages(JOB_FAILED) if retry_failed
+                             else self.manifest.pages(JOB_PENDING, JOB_FAILED))
+                done = self.manifest.results()
+                self.restored = {page: done[page] for page in self.page_nums if page in done}
+                self.page_nums = [page for page in self.page_nums if page in wanted]
+            else:
+                self.manifest.reset(self.page_nums)
+        self.remaining = len(self.page_nums)
+
+    def start_export(self, export_dir, fmt, fontfile=None):
+        """Export this run's pages to <export_dir>/<name>.ocr.<fmt> as they complete."""
+        name = os.path.splitext(os.path.basename(self.path))[0]
+        path = os.path.join(export_dir, f"{name}.ocr.{fmt}")
+        self.exporter = create_exporter(fmt, path, sorted(set(self.page_nums) | set(self.restored)), self.path,
+                                        fontfile)
+
+    def start_indexing(self, search_index):
+        self.search_index = search_index
+        self.search_id = search_index.document(self.key or file_key(self.path), self.path)
+
+    def close(self):
+        if self.doc is not None:
+            self.doc.close()
+            self.doc = None
+        if self.manifest is not None:
+            self.manifest.close()
+            self.manifest = None
+        if self.exporter is not None:
+            self.exporter.close()
+            logger.info(f"Exported {self.exporter.written} pages of {self.path} to {self.exporter.path}")
+            if self.exporter.unsupported_pages:
+                logger.warning(f"{len(self.exporter.unsupported_pages)} pages of {self.path} have characters "
+                               f"the PDF font cannot show ({''.join(sorted(self.exporter.missing_chars))}), "
+                               f"so they cannot be searched; use --export-font with a font that covers them")
+            self.exporter = None
+
+    def summary(self):
+        return {
+            'document': self.path,
+            'pages': self.page_count,
+            'succeeded': self.succeeded,
+            'restored': len(self.restored),
+            'failed': len(self.failed_pages),
+            'cached': self.cached,
+            'text_layer': self.native,
+            'image_bytes': self.image_bytes,
+            'unreduced_image_bytes': self.unreduced_image_bytes,
+            'failed_pages': sorted(self.failed_pages),
+            'seconds': round(self.seconds, 3),
+            'error': self.error,
+        }
+
+def record_result(job, result, out):
+    """Stream one page's JSON line and add it to the document's totals."""
+    record = {'document': job.path, 'page': result.page_num + 1, 'text': result.text, 'cached': result.cached,
+              'text_layer': result.native, 'seconds': round(result.elapsed, 3), 'image': result.image,
+              'error': result.error}
+    out.write(json.dumps(record, ensure_ascii=False) + '\n')
+    out.flush()
+    if job.manifest is not None:
+        job.manifest.record(result)
+    if job.exporter is not None:
+        job.exporter.add_result(result)
+    if job.search_index is not None and result.ok:
+        job.search_index.update_page(job.search_id, result.page_num, result.text)
+
+    job.image_bytes += result.image.get('bytes', 0)
+    job.unreduced_image_bytes += result.image.get('unreduced_bytes', 0)
+    if result.ok:
+        job.succeeded += 1
+        job.cached += result.cached
+        job.native += result.native
+    else:
+        job.failed_pages.append(result.page_num + 1)
+    job.remaining -= 1
+
+def record_restored(job, out):
+    """Stream the pages an earlier run already finished, from the job manifest."""
+    for page, text in sorted(job.restored.items()):
+        record = {'document': job.path, 'page': page + 1, 'text': text, 'restored': True, 'error': None}
+        out.write(json.dumps(record, ensure_ascii=False) + '\n')
+        if job.exporter is not None:
+            job.exporter.add(page, text, restored=True)
+    out.flush()
+    if job.search_index is not None and job.restored:
+        job.search_index.update_pages(job.search_id, job.restored)
+
+def page_batches(page_nums, batch_pages):
+    """Split sorted pages into runs of at most batch_pages consecutive pages."""
+    batch = []
+    for page_num in page_nums:
+        if batch and (len(batch) == batch_pages or page_num != batch[-1] + 1):
+            yield batch
+            batch = []
+        batch.append(page_num)
+    if batch:
+        yield batch
+
+def run_batch(paths, backend, cache=None, concurrency=DEFAULT_OCR_CONCURRENCY, out=sys.stdout, preprocessor=None,
+              text_layer=True, batch_pages=DEFAULT_OCR_BATCH_PAGES, pages=None, jobs_dir=None, resume=False,
+              retry_failed=False, export_dir=None, export_format='txt', export_font=None, search_index=None):
+    """OCR every page of every PDF under paths; returns the DocumentJobs.
+
+    With ``batch_pages`` above one, runs of that many consecutive pages are
+    uploaded together (see ocr_pipeline.ocr_pages). ``pages`` limits every
+    document to a page range such as '1-10,15'. With ``jobs_dir`` each
+    document's job manifest is kept there; ``resume`` then skips the pages an
+    earlier run finished and ``retry_failed`` runs only the pages that failed.
+    Pages skipped that way are written out again from the manifest. With
+    ``export_dir`` every document is also exported in ``export_format`` (see
+    ocr_export) while it runs, and pages are added to ``search_index`` (an
+    ocr_search.SearchIndex) as they complete.
+    """
+    jobs = [DocumentJob(path) for path in find_pdfs(paths)]
+
+    def open_jobs():
+        # Documents are opened, hashed and given their manifest only when their
+        # first batch is due, and closed as soon as their last page is in, so
+        # the submission window bounds the documents open at once.
+        for job in jobs:
+            job.open(pages, jobs_dir, resume, retry_failed)
+            if job.doc is None:
+                continue
+            if export_dir:
+                job.start_export(export_dir, export_format, export_font)
+            if search_index is not None:
+                job.start_indexing(search_index)
+            record_restored(job, out)
+            if job.remaining == 0:
+                job.close()
+                logger.info(f"Nothing to do for {job.path}: {len(job.restored)} pages already done")
+                continue
+            yield job
+
+    if preprocessor is None:
+        preprocessor = PagePreprocessor()
+    start = time.monotonic()
+    # Submission order is document order, so early documents finish first.
+    batches = ((job, page_nums) for job in open_jobs() for page_nums in page_batches(job.page_nums, batch_pages))
+    futures = {}
+
+    def finish(future):
+        job = futures.pop(future)
+        for result in future.result():
+            record_result(job, result, out)
+        if job.remaining == 0:
+            job.seconds = time.monotonic() - start
+            job.close()
+            metrics.write_prometheus()
+            logger.info(f"Finished {job.path}: {job.succeeded}/{len(job.page_nums)} pages")
+
+    pool = ThreadPoolExecutor(max_workers=concurrency)
+    try:
+        while True:
+            # Only a small window of batches is queued, so an interrupted run
+            # stops after the pages in flight instead of working through the queue.
+            for job, page_nums in batches:
+                future = pool.submit(ocr_pages, job.doc, page_nums, backend, cache, None, job.lock, preprocessor,
+                                     text_layer)
+                futures[future] = job
+                if len(futures) >= concurrency * SUBMIT_AHEAD:
+                    break
+            if not futures:
+                break
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                finish(future)
+    except BaseException:
+        # Ctrl+C or a failure: drop the queued batches, but keep the pages that
+        # were already in flight, so a --resume run does not do them again.
+        pool.shutdown(wait=True, cancel_futures=True)
+        for future in list(futures):
+            if future.done() and not future.cancelled() and future.exception() is None:
+                try:
+                    finish(future)
+                except Exception as e:
+                    logger.warning(f"Could not record pages finished before stopping: {str(e)}")
+        for job in jobs:
+            job.close()
+        raise
+    pool.shutdown()
+    return jobs
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="OCR PDF files or directories of PDFs without the GUI.")
+    parser.add_argument('paths', nargs='+', help="PDF files or directories to search for PDFs")
+    parser.add_argument('-o', '--output', default='-',
+                        help="where to stream per-page JSON lines (default: stdout)")
+    parser.add_argument('--summary', help="write a JSON per-document summary to this file")
+    parser.add_argument('-j', '--concurrency', type=int, default=DEFAULT_OCR_CONCURRENCY,
+                        help="pages processed at once across all documents")
+    parser.add_argument('--backend', choices=BACKENDS, default='drive',
+                        help="OCR service; 'offline' is a local stand-in for load testing")
+    parser.add_argument('--request-rate', type=float,
+                        help=f"backend requests per second across all workers, 0 for no limit "
+                             f"(default: {DRIVE_REQUEST_RATE:g} for drive, no limit offline)")
+    parser.add_argument('--max-attempts', type=int, default=MAX_ATTEMPTS,
+                        help="tries per backend call before a page fails")
+    parser.add_argument('--offline-latency', type=float, default=0.5,
+                        help="offline backend: seconds per emulated remote call")
+    parser.add_argument('--offline-failure-rate', type=float, default=0.0,
+                        help="offline backend: probability that a call fails")
+    parser.add_argument('--offline-rate-limit', type=float,
+                        help="offline backend: calls per second before requests are rejected")
+    parser.add_argument('--batch-pages', type=int, default=DEFAULT_OCR_BATCH_PAGES,
+                        help=f"consecutive pages uploaded together as one PDF (1-{MAX_OCR_BATCH_PAGES})")
+    parser.add_argument('--force-ocr', action='store_true',
+                        help="OCR every page, even those with a usable embedded text layer")
+    parser.add_argument('--dpi', type=int, default=DEFAULT_OCR_DPI,
+                        help="render resolution for pages that are not scans")
+    parser.add_argument('--max-dpi', type=int, default=MAX_OCR_DPI,
+                        help="scans are rendered at their own resolution up to this")
+    parser.add_argument('--color-mode', choices=COLOR_MODES, default='auto',
+                        help="colour mode of the page images sent for OCR")
+    parser.add_argument('--no-crop', action='store_true', help="keep the blank margins around page content")
+    parser.add_argument('--measure-savings', action='store_true',
+                        help="also encode each page unreduced to report the bytes saved (costs CPU per page)")
+    parser.add_argument('--client-secret', default=CLIENT_SECRET_FILE, help="Google OAuth client secret file")
+    parser.add_argument('--token', default=TOKEN_FILE, help="where the OAuth token is cached")
+    parser.add_argument('--export-dir', help="also write each document to this directory as it is OCR'd")
+    parser.add_argument('--export-format', choices=EXPORT_FORMATS, default='txt',
+                        help="txt (with page markers), jsonl (per-page metadata) or pdf (searchable copy)")
+    parser.add_argument('--export-font', help="TrueType font for the text of searchable PDFs (non-Latin scripts)")
+    parser.add_argument('--index', nargs='?', const=SEARCH_INDEX_PATH,
+                        help=f"add the text to the full-text search index (default: {SEARCH_INDEX_PATH})")
+    parser.add_argument('--pages', help="only these pages of every document, e.g. 1-10,15,40-")
+    parser.add_argument('--resume', action='store_true',
+                        help="skip pages an earlier run of the same document already finished")
+    parser.add_argument('--retry-failed', action='store_true',
+                        help="run only the pages that failed in an earlier run")
+    parser.add_argument('--jobs-dir', default=JOBS_DIR, help="where per-document job manifests are kept")
+    parser.add_argument('--no-manifest', action='store_true', help="do not record or read job manifests")
+    parser.add_argument('--cache-dir', default=OCR_CACHE_DIR, help="OCR result cache directory")
+    parser.add_argument('--no-cache', action='store_true', help="always send pages to the OCR service")
+    parser.add_argument('--trace', help="append a JSON line per page stage to this file")
+    parser.add_argument('--metrics', help="write Prometheus text-format metrics to this file")
+    args = parser.parse_args(argv)
+    if args.pages:
+        try:
+            parse_page_range(args.pages, 0)
+        except ValueError as e:
+            parser.error(f"--pages: {str(e)}")
+    if args.no_manifest and (args.resume or args.retry_failed):
+        parser.error("--resume and --retry-failed need the job manifests")
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s',
+                        stream=sys.stderr)
+    if args.export_dir:
+        os.makedirs(args.export_dir, exist_ok=True)
+    if args.trace or args.metrics:
+        metrics.enable(args.trace, args.metrics)
+
+    request_rate = args.request_rate
+    if request_rate is None and args.backend == 'drive':
+        request_rate = DRIVE_REQUEST_RATE
+    scheduler = RequestScheduler(request_rate or None, max_attempts=args.max_attempts)
+    if args.backend == 'offline':
+        backend = create_backend('offline', scheduler=scheduler, latency=args.offline_latency,
+                                 failure_rate=args.offline_failure_rate, rate_limit=args.offline_rate_limit)
+    else:
+        backend = create_backend('drive', DriveSession(args.client_secret, args.token), scheduler)
+    cache = None if args.no_cache else OCRCache(args.cache_dir)
+    preprocessor = PagePreprocessor(args.dpi, args.max_dpi, args.color_mode, not args.no_crop,
+                                    args.measure_savings)
+
+    search_index = SearchIndex(args.index) if args.index else None
+    out = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+    try:
+        jobs = run_batch(args.paths, backend, cache, max(args.concurrency, 1), out, preprocessor,
+                         not args.force_ocr, min(max(args.batch_pages, 1), MAX_OCR_BATCH_PAGES), args.pages,
+                         None if args.no_manifest else args.jobs_dir, args.resume, args.retry_failed,
+                         args.export_dir, args.export_format, args.export_font, search_index)
+    except KeyboardInterrupt:
+        logger.warning("Interrupted; pages finished so far are recorded, run again with --resume to continue")
+        return 130
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        if search_index is not None:
+            search_index.close()
+        metrics.close()
+
+    summary = [job.summary() for job in jobs]
+    if args.summary:
+        with open(args.summary, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+    failed = sum(1 for job in summary if job['failed'] or job['error'])
+    logger.info(f"{len(summary)} documents, {failed} with failures")
+    image_stats = preprocessor.stats()
+    if image_stats['unreduced_bytes']:
+        logger.info(f"Page images: {image_stats['bytes']} bytes, "
+                    f"{image_stats['saved_bytes'] * 100 // image_stats['unreduced_bytes']}% smaller than "
+                    f"PNGs of the uncropped, unreduced pages at the same DPI")
+    elif image_stats['pages']:
+        logger.info(f"Page images: {image_stats['bytes']} bytes for {image_stats['pages']} pages")
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
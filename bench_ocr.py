@@ -0,0 +1,276 @@
+"""Per-page OCR pipeline benchmark.
+
+Runs synthetic documents (1, 50 and 1000 pages; text-heavy vector pages and
+image-only "scanned" pages) and any real PDFs given on the command line
+through ocr_pages() against the offline backend, at several concurrency
+levels. The synthetic text pages are always OCR'd, since their text layer
+would skip the pipeline being measured; real PDFs take the text-layer fast
+path unless --force-ocr is given. For every run it reports per-stage latency
+percentiles, pages/second, peak resident memory and the bytes of page images
+uploaded, and saves everything as JSON so two versions can be compared:
+
+    python bench_ocr.py --output before.json
+    python bench_ocr.py --output after.json --compare before.json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import fitz  # PyMuPDF
+
+from ocr_pipeline import (COLOR_MODES, DEFAULT_OCR_BATCH_PAGES, DEFAULT_OCR_DPI, PROGRESS_STAGES, PagePreprocessor,
+                          ocr_pages)
+from ocr_backends import OfflineBackend, RequestScheduler
+
+BENCH_FORMAT_VERSION = 1
+DEFAULT_SIZES = (1, 50, 1000)
+DEFAULT_KINDS = ('text', 'image')
+DEFAULT_CONCURRENCY = (1, 4, 8, 16)
+PERCENTILES = (50, 90, 99)
+SCAN_VARIANTS = 8  # distinct page images in an image-heavy document
+
+WORDS = ('lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor incididunt ut '
+         'labore et dolore magna aliqua ut enim ad minim veniam quis nostrud exercitation ullamco').split()
+
+def page_text(rng, words=450):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+def make_synthetic_pdf(path, pages, kind, seed=0):
+    """Write a text-heavy or image-only PDF with the given number of pages."""
+    rng = random.Random(seed)
+    doc = fitz.open()
+    if kind == 'text':
+        for _ in range(pages):
+            page = doc.new_page()
+            page.insert_textbox(page.rect + (50, 50, -50, -50), page_text(rng), fontsize=10, fontname='helv')
+    elif kind == 'image':
+        # Scans: grayscale 150 dpi images of text pages, a few variants reused so
+        # the file stays small while every page still has to be rasterised.
+        scans = []
+        for _ in range(SCAN_VARIANTS):
+            source = fitz.open()
+            page = source.new_page()
+            page.insert_textbox(page.rect + (50, 50, -50, -50), page_text(rng), fontsize=10, fontname='helv')
+            scans.append(page.get_pixmap(dpi=150, colorspace=fitz.csGRAY).tobytes('png'))
+            source.close()
+        xrefs = [0] * SCAN_VARIANTS
+        for number in range(pages):
+            page = doc.new_page()
+            variant = number % SCAN_VARIANTS
+            if xrefs[variant]:
+                page.insert_image(page.rect, xref=xrefs[variant])
+            else:
+                xrefs[variant] = page.insert_image(page.rect, stream=scans[variant])
+    else:
+        raise ValueError(f"Unknown document kind: {kind}")
+    doc.save(path, garbage=3, deflate=True)
+    doc.close()
+
+def current_rss():
+    """Resident set size in bytes (Linux /proc), or None where unavailable."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+class MemorySampler(threading.Thread):
+    """Samples RSS in the background to find the peak of one benchmark run."""
+
+    def __init__(self, interval=0.05):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = current_rss() or 0
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.peak = max(self.peak, current_rss() or 0)
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+        if not self.peak:
+            # No /proc: fall back to the process-wide peak (kilobytes on Linux, bytes on macOS).
+            maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            self.peak = maxrss if sys.platform == 'darwin' else maxrss * 1024
+        return self.peak
+
+def percentiles(values):
+    if not values:
+        return None
+    ordered = sorted(values)
+    summary = {'mean': round(sum(ordered) / len(ordered), 6), 'max': round(ordered[-1], 6)}
+    for p in PERCENTILES:
+        rank = max(int(round(p / 100.0 * len(ordered) + 0.5)) - 1, 0)
+        summary[f"p{p}"] = round(ordered[min(rank, len(ordered) - 1)], 6)
+    return summary
+
+def run_case(path, concurrency, backend, preprocessor, text_layer=True, batch_pages=DEFAULT_OCR_BATCH_PAGES):
+    """OCR every page of one document at one concurrency level and summarise it."""
+    doc = fitz.open(path)
+    lock = threading.Lock()
+    pages = len(doc)
+    sampler = MemorySampler()
+    sampler.start()
+    start = time.monotonic()
+    def run_pages(first):
+        page_nums = list(range(first, min(first + batch_pages, pages)))
+        return ocr_pages(doc, page_nums, backend, None, None, lock, preprocessor, text_layer)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = [result for batch in pool.map(run_pages, range(0, pages, batch_pages)) for result in batch]
+    wall = time.monotonic() - start
+    peak_rss = sampler.stop()
+    doc.close()
+
+    stages = {}
+    for stage, _ in PROGRESS_STAGES:
+        stages[stage] = percentiles([r.timings[stage] for r in results if stage in r.timings])
+    stages['total'] = percentiles([r.elapsed for r in results])
+    return {
+        'pages': pages,
+        'concurrency': concurrency,
+        'wall_seconds': round(wall, 3),
+        'pages_per_second': round(pages / wall, 3) if wall else None,
+        'failed': sum(1 for r in results if not r.ok),
+        'use_text_layer': text_layer,
+        'text_layer': sum(1 for r in results if r.native),
+        'backend_calls': backend.calls,
+        'rejected_calls': backend.throttled,
+        'peak_rss_bytes': peak_rss,
+        'image_bytes': sum(r.image.get('bytes', 0) for r in results),
+        'unreduced_image_bytes': sum(r.image.get('unreduced_bytes', 0) for r in results),
+        'stages': {stage: summary for stage, summary in stages.items() if summary},
+    }
+
+def print_case(case):
+    total = case['stages'].get('total', {})
+    stage_p50 = '  '.join(f"{stage}={summary['p50'] * 1000:.1f}ms" for stage, summary in case['stages'].items()
+                          if stage != 'total')
+    print(f"{case['document']:<28} c={case['concurrency']:<3} {case['pages_per_second']:>8.2f} pages/s  "
+          f"p50={total.get('p50', 0) * 1000:.0f}ms p99={total.get('p99', 0) * 1000:.0f}ms  "
+          f"rss={case['peak_rss_bytes'] / 2 ** 20:.0f}MB  images={case['image_bytes'] / 2 ** 20:.1f}MB  "
+          f"calls={case['backend_calls']} (429: {case['rejected_calls']})  text-layer={case['text_layer']}  failed={case['failed']}")
+    print(f"{'':<28} {stage_p50}")
+
+def work_differences(old, new):
+    """Why two runs of a document did different work (so their timings cannot be compared), or None."""
+    reasons = []
+    if old.get('use_text_layer', new['use_text_layer']) != new['use_text_layer']:
+        reasons.append(f"text-layer fast path {'on' if old['use_text_layer'] else 'off'} -> "
+                       f"{'on' if new['use_text_layer'] else 'off'}")
+    if old.get('text_layer', 0) != new['text_layer']:
+        reasons.append(f"text-layer pages {old.get('text_layer', 0)} -> {new['text_layer']}")
+    if 'backend_calls' in old and old['backend_calls'] != new['backend_calls']:
+        reasons.append(f"backend calls {old['backend_calls']} -> {new['backend_calls']}")
+    return ', '.join(reasons) or None
+
+def compare(previous, current):
+    """Print throughput and latency changes for runs present in both result sets."""
+    before = {(case['document'], case['concurrency']): case for case in previous['cases']}
+    print("\nComparison with previous results:")
+    for case in current['cases']:
+        old = before.get((case['document'], case['concurrency']))
+        if not old or not old['pages_per_second'] or not case['pages_per_second']:
+            continue
+        differs = work_differences(old, case)
+        if differs:
+            print(f"{case['document']:<28} c={case['concurrency']:<3} not comparable: {differs}")
+            continue
+        speedup = case['pages_per_second'] / old['pages_per_second']
+        old_p50 = old['stages'].get('total', {}).get('p50', 0)
+        new_p50 = case['stages'].get('total', {}).get('p50', 0)
+        print(f"{case['document']:<28} c={case['concurrency']:<3} throughput x{speedup:.2f}  "
+              f"p50 {old_p50 * 1000:.0f}ms -> {new_p50 * 1000:.0f}ms  "
+              f"rss {old['peak_rss_bytes'] / 2 ** 20:.0f}MB -> {case['peak_rss_bytes'] / 2 ** 20:.0f}MB  "
+              f"images {old.get('image_bytes', 0) / 2 ** 20:.1f}MB -> {case['image_bytes'] / 2 ** 20:.1f}MB")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the per-page OCR pipeline against the offline backend.")
+    parser.add_argument('pdfs', nargs='*', help="real PDFs to benchmark in addition to the synthetic ones")
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                        help="page counts of the synthetic documents (empty to skip them)")
+    parser.add_argument('--kinds', default=','.join(DEFAULT_KINDS), help="synthetic document kinds: text, image")
+    parser.add_argument('--concurrency', default=','.join(map(str, DEFAULT_CONCURRENCY)),
+                        help="comma-separated worker counts to try")
+    parser.add_argument('--latency', type=float, default=0.05, help="offline backend seconds per remote call")
+    parser.add_argument('--failure-rate', type=float, default=0.0, help="offline backend failure probability")
+    parser.add_argument('--rate-limit', type=float, help="offline backend calls per second")
+    parser.add_argument('--request-rate', type=float, help="client-side request budget per second")
+    parser.add_argument('--dpi', type=int, default=DEFAULT_OCR_DPI, help="render resolution for non-scan pages")
+    parser.add_argument('--color-mode', choices=COLOR_MODES, default='auto', help="page image colour mode")
+    parser.add_argument('--no-crop', action='store_true', help="keep blank page margins")
+    parser.add_argument('--measure-savings', action='store_true',
+                        help="report unreduced image bytes too (adds a PNG encode to the preprocess stage)")
+    parser.add_argument('--batch-pages', type=int, default=DEFAULT_OCR_BATCH_PAGES,
+                        help="consecutive pages uploaded together")
+    parser.add_argument('--force-ocr', action='store_true',
+                        help="skip the text-layer fast path for real PDFs too (synthetic pages always skip it)")
+    parser.add_argument('--output', default=f"bench-{datetime.datetime.now():%Y%m%d-%H%M%S}.json",
+                        help="where to save the JSON results")
+    parser.add_argument('--compare', help="previous results file to compare against")
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(',') if size]
+    kinds = [kind for kind in args.kinds.split(',') if kind]
+    levels = [int(level) for level in args.concurrency.split(',') if level]
+    backend_options = {'latency': args.latency, 'failure_rate': args.failure_rate, 'rate_limit': args.rate_limit,
+                       'seed': 0}
+
+    results = {
+        'version': BENCH_FORMAT_VERSION,
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pymupdf': fitz.VersionBind,
+        'platform': platform.platform(),
+        'backend': dict(backend_options, name='offline', request_rate=args.request_rate),
+        'preprocess': PagePreprocessor(args.dpi, color_mode=args.color_mode,
+                                       crop_margins=not args.no_crop).cache_settings(),
+        'batch_pages': args.batch_pages,
+        'measure_savings': args.measure_savings,
+        'force_ocr': args.force_ocr,
+        'cases': [],
+    }
+
+    with tempfile.TemporaryDirectory(prefix='rexmi-bench-') as workdir:
+        documents = []
+        for kind in kinds:
+            for size in sizes:
+                path = os.path.join(workdir, f"{kind}-{size}.pdf")
+                make_synthetic_pdf(path, size, kind)
+                documents.append((f"{kind}-{size}", kind, path))
+        documents.extend((os.path.basename(path), 'real', path) for path in args.pdfs)
+
+        for name, kind, path in documents:
+            for level in levels:
+                preprocessor = PagePreprocessor(args.dpi, color_mode=args.color_mode, crop_margins=not args.no_crop,
+                                                measure_savings=args.measure_savings)
+                # A fresh backend per run so rate-limit state does not carry over.
+                backend = OfflineBackend(scheduler=RequestScheduler(args.request_rate, seed=0), **backend_options)
+                text_layer = kind == 'real' and not args.force_ocr
+                case = run_case(path, level, backend, preprocessor, text_layer, max(args.batch_pages, 1))
+                case.update(document=name, kind=kind)
+                results['cases'].append(case)
+                print_case(case)
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults saved to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
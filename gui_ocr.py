@@ -2,136 +2,297 @@ import random
 import string
 import sys
 import os
-import tempfile
+import threading
 import time
+import queue
+import itertools
+from collections import deque, OrderedDict
 import fitz  # PyMuPDF
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
                              QPushButton, QTextEdit, QProgressBar, QFileDialog, QLabel, 
-                             QSplitter, QListWidget, QListWidgetItem, QGraphicsView, QGraphicsScene,
-                             QMessageBox, QMenuBar, QMenu, QAction, QFontDialog)
-from PyQt5.QtCore import Qt, QThread, pyqtSignal, QRectF
-from PyQt5.QtGui import QPixmap, QImage, QPainter, QFont
-import io
+                             QSplitter, QListView, QGraphicsView, QGraphicsScene,
+                             QMessageBox, QMenuBar, QMenu, QAction, QFontDialog, QInputDialog,
+                             QDockWidget, QLineEdit, QListWidget, QListWidgetItem)
+from PyQt5.QtCore import Qt, QThread, QTimer, pyqtSignal, QSize, QAbstractListModel, QModelIndex
+from PyQt5.QtGui import QPixmap, QImage, QPainter, QFont, QColor
 from PyQt5.QtWidgets import QStatusBar
 import logging
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload, MediaIoBaseDownload
-import json
-import base64
-
-import warnings
-warnings.filterwarnings("ignore", message="file_cache is only supported with oauth2client<4.0.0")
+import sqlite3
+from project_store import ProjectJournal, ProjectStore, is_legacy_project, load_legacy_project, write_project
+from ocr_pipeline import (COLOR_MODES, DEFAULT_OCR_BATCH_PAGES, DEFAULT_OCR_CONCURRENCY, MAX_OCR_BATCH_PAGES,
+                          MAX_OCR_CONCURRENCY, MAX_OCR_DPI, MIN_OCR_DPI, OCRCache, PagePreprocessor,
+                          PipelineProgress, ocr_pages)
+from ocr_backends import CLIENT_SECRET_FILE, TOKEN_FILE, DriveSession, create_backend
+from ocr_export import MISSING_GLYPH_SAMPLE, create_exporter, missing_glyphs
+from ocr_jobs import (JOB_DONE, JOB_FAILED, JOB_PENDING, JobManifest, document_key, manifest_path,
+                      parse_page_range)
+from ocr_metrics import RateMeter, metrics
+from ocr_search import SearchIndex, legacy_project_key, project_key
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# If modifying these scopes, delete the file token.json.
-SCOPES = ['https://www.googleapis.com/auth/drive.file']
-
-def get_credentials(client_secret_file):
-    creds = None
-    if os.path.exists('token.json'):
-        creds = Credentials.from_authorized_user_file('token.json', SCOPES)
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file(client_secret_file, SCOPES)
-            creds = flow.run_local_server(port=0)
-        with open('token.json', 'w') as token:
-            token.write(creds.to_json())
-    return creds
-
-import contextlib
-
-def process_image(service, image):
-    try:
-        logger.info("Processing image")
-        mime = 'application/vnd.google-apps.document'
-        file_metadata = {'name': 'temp_image.png', 'mimeType': mime}
-        
-        with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as temp_file:
-            temp_filename = temp_file.name
-            image.save(temp_filename, format='PNG')
-        
-        # Retry mechanism
-        max_retries = 3
-        for attempt in range(max_retries):
-            try:
-                media = MediaFileUpload(temp_filename, mimetype='image/png', resumable=True)
-                file = service.files().create(body=file_metadata, media_body=media, fields='id').execute()
-                
-                request = service.files().export_media(fileId=file['id'], mimeType='text/plain')
-                fh = io.BytesIO()
-                downloader = MediaIoBaseDownload(fh, request)
-                done = False
-                while done is False:
-                    status, done = downloader.next_chunk()
-                
-                service.files().delete(fileId=file['id']).execute()
-                
-                # If successful, break the retry loop
-                break
-            except Exception as e:
-                logger.error(f"Attempt {attempt + 1} failed: {str(e)}")
-                if attempt < max_retries - 1:
-                    time.sleep(2)
-                else:
-                    raise
-
-    except Exception as e:
-        logger.error(f"Error processing image: {str(e)}")
-        return None
-    finally:
-        # Always try to remove the temporary file
-        with contextlib.suppress(Exception):
-            os.remove(temp_filename)
-    
-    return fh.getvalue().decode('utf-8')
-    
-def clean_text(text):
-    cleaned = text.replace(' )', ')').replace('( ', '(').replace('.', '. ').replace(',', ', ')
-    cleaned = ' '.join(cleaned.split())
-    return cleaned
+# Page viewer rendering. Scene coordinates are pages rendered at BASE_RENDER_SCALE;
+# a quick LOW_RES render is shown first and replaced by the base render, and
+# HIGH_RES renders are fetched once the view is zoomed past HIGH_RES_ZOOM.
+LOW_RES_SCALE = 1.0
+BASE_RENDER_SCALE = 2.0
+HIGH_RES_SCALE = 4.0
+HIGH_RES_ZOOM = 1.25
+PIXMAP_CACHE_LIMIT = 256 * 1024 * 1024
+PREFETCH_PAGES = 1
+
+# The viewer shows a blank "Initial Page" ahead of the document's own pages. It
+# is not part of the PDF: view page N is document page N - BLANK_PAGES.
+BLANK_PAGES = 1
+
+# Page list thumbnails: rendered lazily for visible rows only.
+THUMBNAIL_SCALE = 0.15
+THUMBNAIL_SIZE = QSize(90, 128)
+THUMBNAIL_CACHE_SIZE = 300
+
+PAGE_PENDING = 'pending'
+PAGE_IN_FLIGHT = 'in-flight'
+PAGE_DONE = 'done'
+PAGE_FAILED = 'failed'
+
+EDIT_DEBOUNCE_MS = 400  # edits are stored once typing pauses this long
+STATUS_REFRESH_MS = 2000  # status bar refresh while a full OCR runs
+SEARCH_DEBOUNCE_MS = 250  # the search panel queries once typing pauses this long
+METRICS_EXPORT_INTERVAL = 5.0  # seconds between Prometheus file rewrites
+
+# Save Results file types, by the ocr_export format they select.
+EXPORT_FILTERS = {
+    "Text Files (*.txt)": 'txt',
+    "JSON Lines (*.jsonl)": 'jsonl',
+    "Searchable PDF (*.pdf)": 'pdf',
+}
 
 class OCRWorker(QThread):
     progress = pyqtSignal(int)
+    stage = pyqtSignal(str)
     finished = pyqtSignal(str, int)
+    failed = pyqtSignal(str, int)
 
-    def __init__(self, pdf_doc, page_num, client_secret_file):
+    def __init__(self, pdf_doc, page_nums, backend, pdf_lock, cache=None, preprocessor=None, text_layer=True,
+                 job=None, document_key=None):
         super().__init__()
         self.pdf_doc = pdf_doc
-        self.page_num = page_num
-        self.client_secret_file = client_secret_file
+        # The JobManifest and key of the document the worker was started on;
+        # results are recorded there even if another document is open by then.
+        self.job = job
+        self.document_key = document_key
+        self.page_nums = page_nums  # view pages; more than one are uploaded as a batch
+        self.backend = backend
+        self.cache = cache
+        self.preprocessor = preprocessor
+        self.text_layer = text_layer
+        self.results = {}  # page_num -> PageResult
+        # PyMuPDF documents are not thread-safe, so every worker shares one lock
+        # with the viewer while it touches the document.
+        self.pdf_lock = pdf_lock
+        self.last_stage = None
+
+    def report_progress(self, stage, percent):
+        if stage != self.last_stage:
+            self.last_stage = stage
+            self.stage.emit(stage)
+        self.progress.emit(percent)
 
     def run(self):
-        try:
-            creds = get_credentials(self.client_secret_file)
-            service = build('drive', 'v3', credentials=creds)
+        progress = PipelineProgress(self.report_progress)
+        results = ocr_pages(self.pdf_doc, [page_num - BLANK_PAGES for page_num in self.page_nums], self.backend,
+                            self.cache, progress, self.pdf_lock, self.preprocessor, self.text_layer)
+        for page_num, result in zip(self.page_nums, results):
+            self.results[page_num] = result
+            if result.ok:
+                self.finished.emit(result.text, page_num)
+            else:
+                self.failed.emit(result.error, page_num)
 
-            page = self.pdf_doc.load_page(self.page_num)
-            pix = page.get_pixmap()
-            img = QImage(pix.samples, pix.width, pix.height, pix.stride, QImage.Format_RGB888)
+class PageRenderer(QThread):
+    """Renders pages to QImages on a background thread.
 
-            text_content = process_image(service, img)
-            if text_content:
-                result = clean_text(text_content)
-                self.finished.emit(result, self.page_num)
-            else:
-                self.finished.emit("OCR process failed. Check the logs for more information.", self.page_num)
-        except Exception as e:
-            self.finished.emit(f"An error occurred: {str(e)}", self.page_num)
+    Requests are served by priority (the page on screen first, prefetches
+    after). ``reset`` bumps the generation so renders queued for a previous
+    document are dropped instead of being delivered.
+    """
+    rendered = pyqtSignal(int, int, float, QImage)  # generation, page_num, scale, image
+
+    def __init__(self, render_fn, parent=None):
+        super().__init__(parent)
+        self.render_fn = render_fn
+        self.generation = 0
+        self.requests = queue.PriorityQueue()
+        self.pending = set()
+        self.pending_lock = threading.Lock()
+        self.counter = itertools.count()
+
+    def request(self, page_num, scale, priority=1):
+        key = (self.generation, page_num, scale)
+        with self.pending_lock:
+            if key in self.pending:
+                return
+            self.pending.add(key)
+        self.requests.put((priority, next(self.counter), key))
+
+    def reset(self):
+        self.generation += 1
+        with self.pending_lock:
+            self.pending.clear()
+
+    def stop(self):
+        self.requests.put((-1, next(self.counter), None))
+        self.wait()
+
+    def run(self):
+        while True:
+            _, _, key = self.requests.get()
+            if key is None:
+                break
+            with self.pending_lock:
+                self.pending.discard(key)
+            generation, page_num, scale = key
+            if generation != self.generation:
+                continue
+            try:
+                image = self.render_fn(page_num, scale)
+            except Exception as e:
+                logger.error(f"Rendering page {page_num} failed: {str(e)}")
+                continue
+            self.rendered.emit(generation, page_num, scale, image)
+
+class PixmapCache:
+    """Memory-bounded LRU of rendered pages, keyed by (page_num, scale). GUI thread only."""
+
+    def __init__(self, max_bytes=PIXMAP_CACHE_LIMIT):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+
+    @staticmethod
+    def cost(pixmap):
+        return pixmap.width() * pixmap.height() * max(pixmap.depth(), 8) // 8
+
+    def get(self, page_num, scale):
+        pixmap = self.entries.get((page_num, scale))
+        if pixmap is not None:
+            self.entries.move_to_end((page_num, scale))
+        return pixmap
+
+    def best(self, page_num, max_scale=None):
+        """Return (scale, pixmap) for the sharpest cached render of a page, or (None, None)."""
+        best_scale = None
+        for cached_page, scale in self.entries:
+            if cached_page == page_num and (max_scale is None or scale <= max_scale):
+                if best_scale is None or scale > best_scale:
+                    best_scale = scale
+        if best_scale is None:
+            return None, None
+        return best_scale, self.get(page_num, best_scale)
+
+    def put(self, page_num, scale, pixmap):
+        key = (page_num, scale)
+        if key in self.entries:
+            self.size -= self.cost(self.entries.pop(key))
+        self.entries[key] = pixmap
+        self.size += self.cost(pixmap)
+        while self.size > self.max_bytes and len(self.entries) > 1:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= self.cost(evicted)
+
+    def clear(self):
+        self.entries.clear()
+        self.size = 0
+
+class PageListModel(QAbstractListModel):
+    """Virtual page list: rows, labels and thumbnails are produced only when the view asks.
+
+    Thumbnails come from their own PageRenderer and are kept in a small LRU.
+    Per-page OCR state is tracked here so a single row can be repainted when a
+    page changes state, without rebuilding the list.
+    """
+    STATE_COLORS = {
+        PAGE_IN_FLIGHT: QColor(30, 100, 200),
+        PAGE_DONE: QColor(20, 130, 60),
+        PAGE_FAILED: QColor(200, 40, 40),
+    }
+
+    def __init__(self, renderer, parent=None):
+        super().__init__(parent)
+        self.renderer = renderer
+        self.renderer.rendered.connect(self.on_thumbnail_rendered)
+        self.page_count = 0
+        self.states = {}  # page_num -> state; missing pages are pending
+        self.thumbnails = OrderedDict()
+        self.placeholder = QPixmap(THUMBNAIL_SIZE)
+        self.placeholder.fill(QColor(235, 235, 235))
+
+    def reset_pages(self, page_count, done_pages=()):
+        self.beginResetModel()
+        self.renderer.reset()
+        self.page_count = page_count
+        self.states = {page_num: PAGE_DONE for page_num in done_pages}
+        self.thumbnails.clear()
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.page_count
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= self.page_count:
+            return None
+        page_num = index.row()
+        state = self.states.get(page_num, PAGE_PENDING)
+        if role == Qt.DisplayRole:
+            label = "Initial Page" if page_num == 0 else f"Page {page_num}"
+            return label if state == PAGE_PENDING else f"{label} ({state})"
+        if role == Qt.DecorationRole:
+            pixmap = self.thumbnails.get(page_num)
+            if pixmap is None:
+                self.renderer.request(page_num, THUMBNAIL_SCALE)
+                return self.placeholder
+            self.thumbnails.move_to_end(page_num)
+            return pixmap
+        if role == Qt.ForegroundRole:
+            return self.STATE_COLORS.get(state)
+        if role == Qt.ToolTipRole:
+            return f"OCR {state}"
+        return None
+
+    def state(self, page_num):
+        return self.states.get(page_num, PAGE_PENDING)
 
-        # Simulate progress
-        for i in range(101):
-            self.progress.emit(i)
-            self.msleep(50)
+    def set_state(self, page_num, state):
+        if self.states.get(page_num, PAGE_PENDING) == state or not 0 <= page_num < self.page_count:
+            return
+        if state == PAGE_PENDING:
+            self.states.pop(page_num, None)
+        else:
+            self.states[page_num] = state
+        index = self.index(page_num)
+        self.dataChanged.emit(index, index, [Qt.DisplayRole, Qt.ForegroundRole, Qt.ToolTipRole])
+
+    def clear_states(self):
+        self.states.clear()
+        if self.page_count:
+            self.dataChanged.emit(self.index(0), self.index(self.page_count - 1),
+                                  [Qt.DisplayRole, Qt.ForegroundRole, Qt.ToolTipRole])
+
+    def on_thumbnail_rendered(self, generation, page_num, scale, image):
+        if generation != self.renderer.generation or page_num >= self.page_count:
+            return
+        self.thumbnails[page_num] = QPixmap.fromImage(image).scaled(
+            THUMBNAIL_SIZE, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        while len(self.thumbnails) > THUMBNAIL_CACHE_SIZE:
+            self.thumbnails.popitem(last=False)
+        index = self.index(page_num)
+        self.dataChanged.emit(index, index, [Qt.DecorationRole])
 
 class ZoomableGraphicsView(QGraphicsView):
+    zoomed = pyqtSignal(float)
+
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setDragMode(QGraphicsView.ScrollHandDrag)
@@ -139,30 +300,108 @@ class ZoomableGraphicsView(QGraphicsView):
         self.setRenderHint(QPainter.SmoothPixmapTransform)
         self.scale(1, 1)
 
+    def zoom_level(self):
+        # View pixels per scene unit; above 1 the base render is being magnified.
+        return self.transform().m11()
+
     def wheelEvent(self, event):
         if event.angleDelta().y() > 0:
             factor = 1.25
         else:
             factor = 0.8
         self.scale(factor, factor)
+        self.zoomed.emit(self.zoom_level())
 
 class EditableTextEdit(QTextEdit):
+    """The page text pane. Edits are handed to the app once typing pauses.
+
+    Copying the page out with toPlainText() on every keystroke made typing in
+    long pages sluggish; instead a change only marks the pane as edited and
+    restarts a short timer. Call ``flush`` before anything reads the page's
+    stored text.
+    """
+
     def __init__(self, ocr_app, parent=None):
         super().__init__(parent)
         self.ocr_app = ocr_app
-        self.textChanged.connect(self.on_text_changed)
-
-    def on_text_changed(self):
-        self.ocr_app.save_current_text()
+        self.edited = False
+        self.save_timer = QTimer(self)
+        self.save_timer.setSingleShot(True)
+        self.save_timer.setInterval(EDIT_DEBOUNCE_MS)
+        self.save_timer.timeout.connect(self.flush)
+        self.document().contentsChange.connect(self.on_contents_change)
+
+    def on_contents_change(self, position, chars_removed, chars_added):
+        if chars_removed or chars_added:
+            self.edited = True
+            self.save_timer.start()
+
+    def flush(self):
+        self.save_timer.stop()
+        if self.edited:
+            self.edited = False
+            self.ocr_app.save_current_text()
+
+    def set_page_text(self, text):
+        """Show a page's stored text; this is not an edit."""
+        self.setPlainText(text)
+        self.save_timer.stop()
+        self.edited = False
 
 class OCRApp(QMainWindow):
     def __init__(self):
         super().__init__()
         self.ocr_results = {}
         self.full_ocr_in_progress = False
+        self.full_ocr_paused = False
+        self.full_ocr_cancelled = False
+        self.full_ocr_queue = deque()
+        self.full_ocr_done = 0
         self.total_pages = 0
+        self.ocr_concurrency = DEFAULT_OCR_CONCURRENCY
+        self.ocr_batch_pages = DEFAULT_OCR_BATCH_PAGES
+        self.ocr_workers = {}  # page_num -> OCRWorker still waiting for its result (one worker per batch)
+        self.retired_workers = []  # workers that reported but whose thread may still run
+        self.page_progress = {}  # page_num -> progress of an in-flight page
+        self.ocr_rate = RateMeter()
+        self.metrics_written = 0.0  # monotonic time of the last Prometheus file write
+        metrics.configure_from_env()
+        self.pdf_lock = threading.RLock()
+        self.ocr_backend = None
+        self.ocr_cache = None
+        try:
+            self.ocr_cache = OCRCache()
+        except OSError as e:
+            logger.warning(f"OCR cache disabled: {str(e)}")
+        self.ocr_preprocessor = PagePreprocessor()
+        self.use_text_layer = True  # read born-digital pages locally instead of sending them for OCR
+        self.text_layer_pages = 0
+        self.ocr_job = None  # JobManifest of the open document, once a page has been OCR'd
+        self.exporter = None  # ocr_export exporter still waiting for pages of the running full OCR
+        self.export_font = None  # font file for the text of searchable PDFs; None is Base-14 Helvetica (Latin-1)
         self.current_page = 0
         self.pdf_content = None
+        self.document_name = ''  # the PDF or project the document was opened from
+        self.pdf_key = None  # SHA-256 of pdf_content, once needed
+        self.project_id = None  # ProjectStore.project_id of the open project, if it has one
+        self.search_index = None
+        self.search_document_id = None  # the open document's id in search_index
+        try:
+            self.search_index = SearchIndex()
+        except (OSError, sqlite3.Error) as e:
+            logger.warning(f"Search index disabled: {str(e)}")
+        self.pdf_dirty = False  # the PDF is not yet stored in current_project_path
+        self.dirty_pages = set()  # ocr_results keys changed since the last save
+        self.journal = None  # ProjectJournal of current_project_path, once it is saved or opened
+        self.pixmap_cache = PixmapCache()
+        self.page_item = None
+        self.displayed_scale = None
+        self.renderer = PageRenderer(self.render_page_image)
+        self.renderer.rendered.connect(self.on_page_rendered)
+        self.renderer.start()
+        self.thumbnail_renderer = PageRenderer(self.render_page_image)
+        self.thumbnail_renderer.start()
+        self.page_model = PageListModel(self.thumbnail_renderer, self)
         self.initUI()
 
     def initUI(self):
@@ -170,6 +409,7 @@ class OCRApp(QMainWindow):
         self.setGeometry(100, 100, 1200, 800)
 
         self.create_menu_bar()
+        self.create_search_dock()
 
         main_widget = QWidget()
         self.setCentralWidget(main_widget)
@@ -182,8 +422,13 @@ class OCRApp(QMainWindow):
         layout.addWidget(splitter)
 
         # Left side (Page numbers)
-        self.page_list = QListWidget()
-        self.page_list.itemClicked.connect(self.display_page)
+        self.page_list = QListView()
+        self.page_list.setModel(self.page_model)
+        self.page_list.setUniformItemSizes(True)
+        self.page_list.setLayoutMode(QListView.Batched)
+        self.page_list.setBatchSize(100)
+        self.page_list.setIconSize(THUMBNAIL_SIZE)
+        self.page_list.clicked.connect(self.display_page)
 
         # Middle (PDF Preview)
         middle_widget = QWidget()
@@ -193,6 +438,7 @@ class OCRApp(QMainWindow):
         self.graphics_view = ZoomableGraphicsView()
         self.graphics_scene = QGraphicsScene()
         self.graphics_view.setScene(self.graphics_scene)
+        self.graphics_view.zoomed.connect(self.on_zoomed)
 
         middle_layout.addWidget(self.graphics_view)
 
@@ -223,6 +469,11 @@ class OCRApp(QMainWindow):
         self.setStatusBar(self.statusBar)
         self.update_status_bar()
 
+        # Keeps the pages/min figure moving while pages are slow to come back.
+        self.status_timer = QTimer(self)
+        self.status_timer.setInterval(STATUS_REFRESH_MS)
+        self.status_timer.timeout.connect(self.refresh_full_ocr_status)
+
     def create_menu_bar(self):
         menubar = self.menuBar()
 
@@ -252,14 +503,67 @@ class OCRApp(QMainWindow):
         full_ocr_action.triggered.connect(self.full_ocr)
         operations_menu.addAction(full_ocr_action)
 
+        self.pause_ocr_action = QAction('Pause Full OCR', self)
+        self.pause_ocr_action.triggered.connect(self.toggle_pause_full_ocr)
+        self.pause_ocr_action.setEnabled(False)
+        operations_menu.addAction(self.pause_ocr_action)
+
+        self.cancel_ocr_action = QAction('Cancel Full OCR', self)
+        self.cancel_ocr_action.triggered.connect(self.cancel_full_ocr)
+        self.cancel_ocr_action.setEnabled(False)
+        operations_menu.addAction(self.cancel_ocr_action)
+
+        retry_failed_action = QAction('Retry Failed Pages', self)
+        retry_failed_action.triggered.connect(self.retry_failed_ocr)
+        operations_menu.addAction(retry_failed_action)
+
+        page_range_action = QAction('OCR Page Range...', self)
+        page_range_action.triggered.connect(self.ocr_page_range)
+        operations_menu.addAction(page_range_action)
+
+        concurrency_action = QAction('OCR Concurrency...', self)
+        concurrency_action.triggered.connect(self.choose_ocr_concurrency)
+        operations_menu.addAction(concurrency_action)
+
+        batch_action = QAction('OCR Batch Size...', self)
+        batch_action.triggered.connect(self.choose_ocr_batch_pages)
+        operations_menu.addAction(batch_action)
+
+        image_mode_action = QAction('OCR Image Mode...', self)
+        image_mode_action.triggered.connect(self.choose_ocr_image_mode)
+        operations_menu.addAction(image_mode_action)
+
+        resolution_action = QAction('OCR Resolution...', self)
+        resolution_action.triggered.connect(self.choose_ocr_resolution)
+        operations_menu.addAction(resolution_action)
+
+        text_layer_action = QAction('Use PDF Text Layer', self)
+        text_layer_action.setCheckable(True)
+        text_layer_action.setChecked(self.use_text_layer)
+        text_layer_action.toggled.connect(self.set_use_text_layer)
+        operations_menu.addAction(text_layer_action)
+
         current_page_ocr_action = QAction('Current Page OCR', self)
         current_page_ocr_action.triggered.connect(self.current_page_ocr)
         operations_menu.addAction(current_page_ocr_action)
 
+        clear_cache_action = QAction('Clear OCR Cache', self)
+        clear_cache_action.triggered.connect(self.clear_ocr_cache)
+        operations_menu.addAction(clear_cache_action)
+
+        search_action = QAction('Search All Documents...', self)
+        search_action.setShortcut('Ctrl+Shift+F')
+        search_action.triggered.connect(self.show_search)
+        operations_menu.addAction(search_action)
+
         save_results_action = QAction('Save Results', self)
         save_results_action.triggered.connect(self.save_results)
         operations_menu.addAction(save_results_action)
 
+        export_font_action = QAction('Searchable PDF Font...', self)
+        export_font_action.triggered.connect(self.choose_export_font)
+        operations_menu.addAction(export_font_action)
+
         # Font menu
         font_menu = menubar.addMenu('Font')
 
@@ -282,6 +586,73 @@ class OCRApp(QMainWindow):
         dev_info_action.triggered.connect(self.show_dev_info)
         dev_menu.addAction(dev_info_action)
 
+    def create_search_dock(self):
+        self.search_box = QLineEdit()
+        self.search_box.setPlaceholderText('Search the OCR text of all documents ("exact phrase")')
+        self.search_box.setClearButtonEnabled(True)
+        self.search_results = QListWidget()
+        self.search_results.itemClicked.connect(self.open_search_hit)
+        self.search_results.itemActivated.connect(self.open_search_hit)
+
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(SEARCH_DEBOUNCE_MS)
+        self.search_timer.timeout.connect(self.run_search)
+        self.search_box.textChanged.connect(self.search_timer.start)
+        self.search_box.returnPressed.connect(self.run_search)
+
+        search_widget = QWidget()
+        search_layout = QVBoxLayout()
+        search_widget.setLayout(search_layout)
+        search_layout.addWidget(self.search_box)
+        search_layout.addWidget(self.search_results)
+
+        self.search_dock = QDockWidget("Search", self)
+        self.search_dock.setWidget(search_widget)
+        self.addDockWidget(Qt.BottomDockWidgetArea, self.search_dock)
+        self.search_dock.hide()
+
+    def show_search(self):
+        self.search_dock.show()
+        self.search_box.setFocus()
+        self.search_box.selectAll()
+
+    def run_search(self):
+        self.search_timer.stop()
+        self.search_results.clear()
+        query = self.search_box.text()
+        if self.search_index is None or not query.strip():
+            return
+        self.extracted_text.flush()  # so the page being edited is searched as it is now
+        start = time.perf_counter()
+        try:
+            hits = self.search_index.search(query)
+        except sqlite3.Error as e:
+            self.statusBar.showMessage(f"Search failed: {str(e)}")
+            return
+        for hit in hits:
+            item = QListWidgetItem(f"{hit.name}, page {hit.page + 1}: {hit.snippet}")
+            item.setToolTip(hit.path)
+            item.setData(Qt.UserRole, (hit.key, hit.path, hit.page))
+            self.search_results.addItem(item)
+        self.statusBar.showMessage(f"{len(hits)} matches in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    def open_search_hit(self, item):
+        key, path, page = item.data(Qt.UserRole)
+        if not (self.pdf_content and key == self.current_search_key()):
+            if self.ocr_blocks_switch():
+                return
+            if not os.path.exists(path):
+                QMessageBox.warning(self, "Warning", f"{path} no longer exists.")
+                return
+            if path.lower().endswith('.rexmi'):
+                self._load_project_from_file(path, announce=False)
+            else:
+                self.open_pdf(path)
+                self.restore_finished_pages()
+        if page + BLANK_PAGES < self.page_count():
+            self.display_page(page + BLANK_PAGES)
+
     def show_dev_info(self):
         QMessageBox.information(self, "Developer Information", 
                                 "Developer: Sujith S\n"
@@ -295,123 +666,619 @@ class OCRApp(QMainWindow):
             project_info += f"Project: {os.path.basename(self.current_project_path)}"
         else:
             project_info += "No project loaded"
+        if self.ocr_cache:
+            stats = self.ocr_cache.stats()
+            project_info += f" | OCR cache: {stats['hits']} hits, {stats['misses']} misses"
+        if self.text_layer_pages:
+            project_info += f" | {self.text_layer_pages} pages from text layer"
+        image_stats = self.ocr_preprocessor.stats()
+        if image_stats['pages']:
+            project_info += f" | Page images: {image_stats['bytes'] / 2 ** 20:.1f} MB uploaded"
+        if self.full_ocr_in_progress:
+            project_info += f" | {self.full_ocr_done}/{self.total_pages} pages, {self.ocr_rate.per_minute():.1f} pages/min"
         self.statusBar.showMessage(project_info)
 
+    def refresh_full_ocr_status(self):
+        if self.full_ocr_in_progress and not (self.full_ocr_paused or self.full_ocr_cancelled):
+            self.update_status_bar()
+
+    def export_metrics(self, force=False):
+        # Rewriting the Prometheus file on every page would be wasted I/O on fast runs.
+        now = time.monotonic()
+        if force or now - self.metrics_written >= METRICS_EXPORT_INTERVAL:
+            self.metrics_written = now
+            metrics.write_prometheus()
+
+    def clear_ocr_cache(self):
+        if self.ocr_cache:
+            self.ocr_cache.clear()
+        self.update_status_bar()
+        QMessageBox.information(self, "OCR Cache", "The OCR cache has been cleared.")
+
+    def ocr_blocks_switch(self):
+        """Warn and return True while pages of the open document are still being OCR'd.
+
+        Workers hold the document they were started on and report pages by
+        number, so another document must not replace it under them.
+        """
+        if not (self.full_ocr_in_progress or self.ocr_workers):
+            return False
+        QMessageBox.warning(self, "Warning", "OCR is still running on this document. Wait for it to finish "
+                                             "(or cancel Full OCR) before opening another one.")
+        return True
+
     def new_project(self):
+        if self.ocr_blocks_switch():
+            return
         self.ocr_results.clear()
+        self.dirty_pages.clear()
         self.current_page = 0
         self.pdf_content = None
-        self.page_list.clear()
-        self.graphics_scene.clear()
-        self.extracted_text.clear()
+        self.page_model.reset_pages(0)
+        self.clear_page_view()
+        self.extracted_text.set_page_text("")
         self.open_file()
 
     def open_file(self):
+        if self.ocr_blocks_switch():
+            return
         file_path, _ = QFileDialog.getOpenFileName(self, "Open PDF", "", "PDF Files (*.pdf)")
         if file_path:
-            self.pdf_doc = fitz.open(file_path)
-            
-            # Create a new PDF with an empty first page
-            new_pdf = fitz.open()
-            new_pdf.new_page(width=self.pdf_doc[0].rect.width, height=self.pdf_doc[0].rect.height)
-            
-            # Add the pages from the opened PDF
-            new_pdf.insert_pdf(self.pdf_doc)
-            
-            # Replace the old PDF with the new one
-            self.pdf_doc = new_pdf
-            
-            with open(file_path, 'rb') as file:
-                self.pdf_content = base64.b64encode(file.read()).decode('utf-8')
-            self.update_page_list()
-            self.initialize_first_page()
-            self.update_status_bar()
+            self.open_pdf(file_path)
+
+    def open_pdf(self, file_path):
+        # Read the file once; the document is opened straight from these
+        # bytes, which are also what a saved project stores.
+        with open(file_path, 'rb') as file:
+            self.pdf_content = file.read()
+        self.pdf_doc = fitz.open(stream=self.pdf_content, filetype='pdf')
+        self.set_document(file_path)
+        self.reset_page_cache()
+        # A fresh document: no text yet, and it belongs to no project until it is saved.
+        self.ocr_results = {}
+        self.dirty_pages = set()
+        if hasattr(self, 'current_project_path'):
+            del self.current_project_path
+        self.pdf_dirty = True
+        self.close_journal()
+        self.update_page_list()
+        self.initialize_first_page()
+        self.update_status_bar()
+
+    def restore_finished_pages(self):
+        """Show the text already recognised for the open PDF: from its job manifest, else from the search index."""
+        pages = {}
+        try:
+            if os.path.exists(manifest_path(self.current_document_key())):
+                pages = self.get_ocr_job().results()
+                self.index_pages({str(page + BLANK_PAGES): text for page, text in pages.items()})
+            elif self.search_index is not None:
+                pages = self.search_index.document_pages(self.current_document_key())
+        except sqlite3.Error as e:
+            logger.warning(f"Could not restore finished pages: {str(e)}")
+        for page, text in pages.items():
+            if page + BLANK_PAGES < self.page_count():
+                self.ocr_results[str(page + BLANK_PAGES)] = text
+                self.page_model.set_state(page + BLANK_PAGES, PAGE_DONE)
 
     def update_page_list(self):
-        self.page_list.clear()
-        self.page_list.addItem(QListWidgetItem("Initial Page"))
-        for i in range(1, len(self.pdf_doc)):
-            item = QListWidgetItem(f"Page {i}")
-            self.page_list.addItem(item)
+        # Only the row count changes here; rows and thumbnails are produced on demand.
+        page_count = self.page_count()
+        done_pages = [int(page) for page in self.ocr_results if BLANK_PAGES <= int(page) < page_count]
+        self.page_model.reset_pages(page_count, done_pages)
 
     def save_current_text(self):
         if hasattr(self, 'pdf_doc') and self.current_page is not None:
-            current_text = self.extracted_text.toPlainText()
-            self.ocr_results[str(self.current_page)] = current_text
+            self.set_page_text(str(self.current_page), self.extracted_text.toPlainText())
+
+    def set_page_text(self, key, text):
+        """Store one page's text, marking it for the next save and journaling the change."""
+        old = self.ocr_results.get(key)
+        if old == text:
+            return
+        self.ocr_results[key] = text
+        self.dirty_pages.add(key)
+        if self.journal:
+            self.journal.record(key, old, text)
+        self.index_pages({key: text})
+
+    def close_journal(self):
+        if self.journal:
+            self.journal.close()
+            self.journal = None
+
+    def set_document(self, name, project_id=None):
+        """Forget what was derived from the previous document, now that name is open."""
+        self.document_name = name
+        self.pdf_key = None
+        self.project_id = project_id
+        self.search_document_id = None
+        self.close_ocr_job()
+
+    def current_document_key(self):
+        if self.pdf_key is None:
+            self.pdf_key = document_key(self.pdf_content)
+        return self.pdf_key
+
+    def current_search_key(self):
+        """Projects are searched as themselves, PDFs by their content (like the batch command line)."""
+        if self.project_id:
+            return project_key(self.project_id)
+        if self.document_name.lower().endswith('.rexmi'):
+            return legacy_project_key(self.document_name)
+        return self.current_document_key()
+
+    def index_pages(self, pages, replace=False):
+        """Bring the search index up to date with pages ({ocr_results key: text}); replace drops all others."""
+        if self.search_index is None or not self.pdf_content:
+            return
+        pages = {int(key) - BLANK_PAGES: text for key, text in pages.items() if int(key) >= BLANK_PAGES}
+        try:
+            if self.search_document_id is None:
+                self.search_document_id = self.search_index.document(self.current_search_key(),
+                                                                     self.document_name)
+            if replace:
+                self.search_index.replace_document(self.search_document_id, pages)
+            else:
+                self.search_index.update_pages(self.search_document_id, pages)
+        except sqlite3.Error as e:
+            logger.warning(f"Search index not updated: {str(e)}")
+
+    def get_ocr_job(self):
+        """The open document's job manifest, where every page's OCR outcome is kept as it arrives."""
+        if self.ocr_job is None:
+            self.ocr_job = JobManifest(self.current_document_key(), len(self.pdf_doc), self.document_name)
+        return self.ocr_job
+
+    def close_ocr_job(self):
+        if self.ocr_job:
+            # Workers still running on this document close it once they have reported.
+            if not any(worker.job is self.ocr_job for worker in self.ocr_workers.values()):
+                self.ocr_job.close()
+            self.ocr_job = None
+
+    def record_page_result(self, page_num):
+        """Record a finished page in its document's job manifest and pass it to any export in progress.
+
+        Returns False if the page belongs to a document that is no longer open.
+        """
+        worker = self.ocr_workers.get(page_num)
+        if worker is None:
+            return False
+        result = worker.results[page_num]
+        worker.job.record(result)
+        if worker.document_key != self.pdf_key:
+            if not any(other.job is worker.job for other_page, other in self.ocr_workers.items()
+                       if other_page != page_num):
+                worker.job.close()
+            return False
+        if self.exporter:
+            self.exporter.add_result(result)
+        return True
 
     def display_page(self, index):
-        self.save_current_text()  # Save the current page's text before switching
+        self.extracted_text.flush()  # Save the current page's text before switching
 
-        if isinstance(index, QListWidgetItem):
-            index = self.page_list.row(index)
+        if isinstance(index, QModelIndex):
+            index = index.row()
         
         self.current_page = index
-        page = self.pdf_doc.load_page(index)
-        pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))
-        img = QImage(pix.samples, pix.width, pix.height, pix.stride, QImage.Format_RGB888)
-        pixmap = QPixmap.fromImage(img)
-
-        self.graphics_scene.clear()
-        self.graphics_scene.addPixmap(pixmap)
-        self.graphics_view.setSceneRect(QRectF(pixmap.rect()))
-        self.graphics_view.fitInView(self.graphics_scene.sceneRect(), Qt.KeepAspectRatio)
+        self.page_list.setCurrentIndex(self.page_model.index(index))
+        self.clear_page_view()
+        scale, pixmap = self.pixmap_cache.best(index, BASE_RENDER_SCALE)
+        if pixmap is not None:
+            self.show_page_pixmap(pixmap, scale)
+        if scale != BASE_RENDER_SCALE:
+            if scale is None:
+                self.renderer.request(index, LOW_RES_SCALE, priority=0)
+            self.renderer.request(index, BASE_RENDER_SCALE, priority=0)
+        self.prefetch_neighbours(index)
         
         if str(index) in self.ocr_results:
-            self.extracted_text.setPlainText(self.ocr_results[str(index)])
+            self.extracted_text.set_page_text(self.ocr_results[str(index)])
             logger.info(f"Text found for page {index}")
         else:
-            self.extracted_text.setPlainText("")
+            self.extracted_text.set_page_text("")
             logger.warning(f"No text found for page {index}")
 
+    def page_count(self):
+        """Number of pages in the viewer, including the blank initial page."""
+        if not hasattr(self, 'pdf_doc'):
+            return 0
+        return len(self.pdf_doc) + BLANK_PAGES
+
+    def render_page_image(self, page_num, scale):
+        # Runs on the renderer thread; the QImage copy owns its pixels once pix is gone.
+        with self.pdf_lock:
+            if page_num < BLANK_PAGES:
+                rect = self.pdf_doc[0].rect if len(self.pdf_doc) else fitz.paper_rect('a4')
+                image = QImage(int(rect.width * scale), int(rect.height * scale), QImage.Format_RGB888)
+                image.fill(Qt.white)
+                return image
+            page = self.pdf_doc.load_page(page_num - BLANK_PAGES)
+            pix = page.get_pixmap(matrix=fitz.Matrix(scale, scale))
+        return QImage(pix.samples, pix.width, pix.height, pix.stride, QImage.Format_RGB888).copy()
+
+    def reset_page_cache(self):
+        # Called whenever a different document is loaded.
+        self.renderer.reset()
+        self.pixmap_cache.clear()
+        self.clear_page_view()
+
+    def clear_page_view(self):
+        self.graphics_scene.clear()
+        self.page_item = None
+        self.displayed_scale = None
+
+    def show_page_pixmap(self, pixmap, scale):
+        if self.page_item is None:
+            self.page_item = self.graphics_scene.addPixmap(pixmap)
+            self.page_item.setTransformationMode(Qt.SmoothTransformation)
+            self.page_item.setScale(BASE_RENDER_SCALE / scale)
+            self.graphics_view.setSceneRect(self.page_item.sceneBoundingRect())
+            self.graphics_view.fitInView(self.graphics_scene.sceneRect(), Qt.KeepAspectRatio)
+        else:
+            # Sharper render of the page already on screen: keep the user's zoom and scroll.
+            self.page_item.setPixmap(pixmap)
+            self.page_item.setScale(BASE_RENDER_SCALE / scale)
+        self.displayed_scale = scale
+
+    def on_page_rendered(self, generation, page_num, scale, image):
+        if generation != self.renderer.generation:
+            return
+        pixmap = QPixmap.fromImage(image)
+        self.pixmap_cache.put(page_num, scale, pixmap)
+        if page_num == self.current_page and (self.displayed_scale is None or scale > self.displayed_scale):
+            self.show_page_pixmap(pixmap, scale)
+
+    def prefetch_neighbours(self, index):
+        for offset in range(1, PREFETCH_PAGES + 1):
+            for neighbour in (index + offset, index - offset):
+                if 0 <= neighbour < self.page_count() and self.pixmap_cache.get(neighbour, BASE_RENDER_SCALE) is None:
+                    self.renderer.request(neighbour, BASE_RENDER_SCALE, priority=offset)
+
+    def request_high_res(self):
+        if not hasattr(self, 'pdf_doc') or self.graphics_view.zoom_level() < HIGH_RES_ZOOM:
+            return
+        scale, pixmap = self.pixmap_cache.best(self.current_page)
+        if pixmap is not None and scale >= HIGH_RES_SCALE:
+            if scale > (self.displayed_scale or 0):
+                self.show_page_pixmap(pixmap, scale)
+            return
+        self.renderer.request(self.current_page, HIGH_RES_SCALE, priority=0)
+
+    def on_zoomed(self, level):
+        self.request_high_res()
+
+    def closeEvent(self, event):
+        self.extracted_text.flush()
+        self.stop_ocr_workers()
+        self.close_journal()  # kept on disk: unsaved edits are recovered when the project is reopened
+        self.close_ocr_job()
+        if self.exporter:
+            self.exporter.close()
+        if self.search_index:
+            self.search_index.close()
+        self.renderer.stop()
+        self.thumbnail_renderer.stop()
+        metrics.close()
+        super().closeEvent(event)
+
+    def stop_ocr_workers(self):
+        """Cancel Full OCR and wait for the pages in flight, recording them; for closing the window."""
+        if self.full_ocr_in_progress:
+            self.full_ocr_cancelled = True
+            self.full_ocr_queue.clear()
+        workers = set(self.ocr_workers.values()) | set(self.retired_workers)
+        if workers:
+            self.statusBar.showMessage(f"Waiting for {len(self.ocr_workers)} pages in flight...")
+            QApplication.processEvents()
+        for worker in workers:
+            worker.wait()
+        # Their results are still queued as signals that will not be delivered
+        # before the manifest closes, so they are recorded here instead.
+        for page_num in sorted(self.ocr_workers):
+            if page_num in self.ocr_workers[page_num].results:
+                self.record_page_result(page_num)
+            del self.ocr_workers[page_num]
+        self.retired_workers.clear()
+
     def initialize_first_page(self):
-        if self.pdf_doc and len(self.pdf_doc) > 0:
+        if self.page_count() > 0:
             self.current_page = 0
             self.display_page(0)
             self.save_current_text()  # Ensure the first page's text is saved
 
     def current_page_ocr(self):
-        self.run_ocr(self.current_page)
+        if self.full_ocr_in_progress:
+            self.statusBar.showMessage("Full OCR is running; this page is part of it.")
+            return
+        if self.current_page in self.ocr_workers:
+            return
+        if self.current_page < BLANK_PAGES:
+            self.statusBar.showMessage("The initial page is blank; choose a document page to OCR.")
+            return
+        self.progress_bar.setFormat("%p%")
+        self.progress_bar.setVisible(True)
+        self.progress_bar.setValue(0)
+        self.run_ocr([self.current_page])
 
     def full_ocr(self):
-        self.ocr_results.clear()
-        self.current_page = 0
-        self.full_ocr_in_progress = True
-        self.total_pages = len(self.pdf_doc)
-        self.run_ocr(self.current_page)
+        if not hasattr(self, 'pdf_doc'):
+            QMessageBox.warning(self, "Warning", "No document loaded. Please open a PDF first.")
+            return
+        if self.full_ocr_in_progress:
+            return
 
-    def run_ocr(self, page_num):
-        client_secret_file = 'client_secret.json'  # Update this path
+        job = self.get_ocr_job()
+        counts = job.counts()
+        if job.started() and not job.complete():
+            answer = QMessageBox.question(
+                self, "Resume Full OCR",
+                f"A previous Full OCR of this document stopped after {counts[JOB_DONE]} of {job.page_count} pages "
+                f"({counts[JOB_FAILED]} failed).\n\nResume it? Choose No to start over from the first page.",
+                QMessageBox.Yes | QMessageBox.No | QMessageBox.Cancel, QMessageBox.Yes)
+            if answer == QMessageBox.Cancel:
+                return
+            if answer == QMessageBox.Yes:
+                self.resume_full_ocr(job)
+                return
+
+        self.dirty_pages.update(self.ocr_results)
+        self.ocr_results.clear()
+        if self.journal:
+            self.journal.record_clear()
+        self.index_pages({}, replace=True)
+        self.page_model.clear_states()
+        job.reset(range(job.page_count))
+        self.start_full_ocr(range(BLANK_PAGES, self.page_count()))
+
+    def resume_full_ocr(self, job):
+        """Take back the pages the manifest has finished and queue the rest."""
+        for page, text in job.results().items():
+            key = str(page + BLANK_PAGES)
+            if key not in self.ocr_results:  # text already here may have been edited since
+                self.set_page_text(key, text)
+            self.page_model.set_state(page + BLANK_PAGES, PAGE_DONE)
+        self.start_full_ocr([page + BLANK_PAGES for page in job.pages(JOB_PENDING, JOB_FAILED)])
+
+    def retry_failed_ocr(self):
+        if not hasattr(self, 'pdf_doc'):
+            QMessageBox.warning(self, "Warning", "No document loaded. Please open a PDF first.")
+            return
+        if self.full_ocr_in_progress:
+            return
+        failed = self.get_ocr_job().pages(JOB_FAILED)
+        if not failed:
+            QMessageBox.information(self, "Retry Failed Pages", "No pages of this document have failed OCR.")
+            return
+        self.start_full_ocr([page + BLANK_PAGES for page in failed])
 
+    def ocr_page_range(self):
+        if not hasattr(self, 'pdf_doc'):
+            QMessageBox.warning(self, "Warning", "No document loaded. Please open a PDF first.")
+            return
+        if self.full_ocr_in_progress:
+            return
+        spec, ok = QInputDialog.getText(self, "OCR Page Range", "Pages to OCR (e.g. 1-10, 15, 40-):")
+        if not ok or not spec.strip():
+            return
+        try:
+            pages = parse_page_range(spec, len(self.pdf_doc))
+        except ValueError as e:
+            QMessageBox.warning(self, "OCR Page Range", str(e))
+            return
+        if not pages:
+            QMessageBox.warning(self, "OCR Page Range", f"The document has only {len(self.pdf_doc)} pages.")
+            return
+        self.get_ocr_job().reset(pages)
+        self.start_full_ocr([page + BLANK_PAGES for page in pages])
+
+    def start_full_ocr(self, page_nums):
+        """Run the given view pages as a full OCR: queued, paced by the worker pool, pausable."""
+        for page_num in page_nums:
+            if page_num not in self.ocr_workers:
+                self.page_model.set_state(page_num, PAGE_PENDING)
+        self.total_pages = len(page_nums)
+        self.full_ocr_queue = deque(page_nums)
+        self.full_ocr_done = 0
+        self.full_ocr_paused = False
+        self.full_ocr_cancelled = False
+        self.full_ocr_in_progress = True
+        self.page_progress.clear()
+        self.ocr_rate.reset()
+        self.status_timer.start()
+
+        self.pause_ocr_action.setText('Pause Full OCR')
+        self.pause_ocr_action.setEnabled(True)
+        self.cancel_ocr_action.setEnabled(True)
+        self.progress_bar.setFormat("%p%")
         self.progress_bar.setVisible(True)
         self.progress_bar.setValue(0)
-        self.worker = OCRWorker(self.pdf_doc, page_num, client_secret_file)
-        self.worker.progress.connect(self.update_progress)
-        self.worker.finished.connect(self.display_result)
-        self.worker.start()
+        self.dispatch_full_ocr()
 
-    def update_progress(self, value):
-        if self.full_ocr_in_progress:
-            overall_progress = (self.current_page * 100 + value) // self.total_pages
-            self.progress_bar.setValue(overall_progress)
+    def dispatch_full_ocr(self):
+        """Start queued pages until the worker pool is full."""
+        if self.full_ocr_paused or self.full_ocr_cancelled:
+            return
+        while self.full_ocr_queue and len(set(self.ocr_workers.values())) < self.ocr_concurrency:
+            page_nums = []
+            while self.full_ocr_queue and len(page_nums) < self.ocr_batch_pages:
+                page_num = self.full_ocr_queue.popleft()
+                if page_num not in self.ocr_workers:
+                    page_nums.append(page_num)
+            if page_nums:
+                self.run_ocr(page_nums)
+
+    def toggle_pause_full_ocr(self):
+        if not self.full_ocr_in_progress:
+            return
+        self.full_ocr_paused = not self.full_ocr_paused
+        if self.full_ocr_paused:
+            # Pages already in flight are allowed to finish; nothing new starts.
+            self.pause_ocr_action.setText('Resume Full OCR')
+            self.statusBar.showMessage("Full OCR paused")
+        else:
+            self.pause_ocr_action.setText('Pause Full OCR')
+            self.update_status_bar()
+            self.dispatch_full_ocr()
+
+    def cancel_full_ocr(self):
+        if not self.full_ocr_in_progress:
+            return
+        self.full_ocr_cancelled = True
+        self.full_ocr_queue.clear()
+        self.pause_ocr_action.setEnabled(False)
+        self.cancel_ocr_action.setEnabled(False)
+        self.statusBar.showMessage("Cancelling Full OCR, waiting for pages in flight...")
+        if not self.ocr_workers:
+            self.finish_full_ocr()
+
+    def finish_full_ocr(self):
+        cancelled = self.full_ocr_cancelled
+        self.full_ocr_in_progress = False
+        self.full_ocr_paused = False
+        self.full_ocr_cancelled = False
+        self.full_ocr_queue.clear()
+        self.page_progress.clear()
+        self.status_timer.stop()
+        self.export_metrics(force=True)
+        self.pause_ocr_action.setText('Pause Full OCR')
+        self.pause_ocr_action.setEnabled(False)
+        self.cancel_ocr_action.setEnabled(False)
+        self.progress_bar.setVisible(False)
+        self.update_status_bar()
+        self.finish_export()
+        if cancelled:
+            QMessageBox.information(self, "OCR Cancelled",
+                                    f"Full OCR was cancelled after {self.full_ocr_done} of {self.total_pages} pages. "
+                                    f"Run Full OCR again to resume it.")
+            return
+        failed = self.get_ocr_job().counts()[JOB_FAILED]
+        if failed:
+            QMessageBox.warning(self, "OCR Complete",
+                                f"Full OCR has finished, but {failed} pages failed. "
+                                f"Use Retry Failed Pages to run them again.")
         else:
+            QMessageBox.information(self, "OCR Complete", "Full OCR process has been completed.")
+
+    def choose_ocr_concurrency(self):
+        value, ok = QInputDialog.getInt(self, "OCR Concurrency", "Pages to process at once:",
+                                        self.ocr_concurrency, 1, MAX_OCR_CONCURRENCY)
+        if ok:
+            self.ocr_concurrency = value
+            if self.full_ocr_in_progress:
+                self.dispatch_full_ocr()
+
+    def choose_ocr_batch_pages(self):
+        value, ok = QInputDialog.getInt(self, "OCR Batch Size", "Pages uploaded together:",
+                                        self.ocr_batch_pages, 1, MAX_OCR_BATCH_PAGES)
+        if ok:
+            self.ocr_batch_pages = value
+
+    def choose_ocr_image_mode(self):
+        current = COLOR_MODES.index(self.ocr_preprocessor.color_mode)
+        mode, ok = QInputDialog.getItem(self, "OCR Image Mode", "Colour mode of the images sent for OCR:",
+                                        COLOR_MODES, current, False)
+        if ok:
+            self.ocr_preprocessor.color_mode = mode
+
+    def choose_ocr_resolution(self):
+        value, ok = QInputDialog.getInt(self, "OCR Resolution", "DPI for pages that are not scans:",
+                                        self.ocr_preprocessor.dpi, MIN_OCR_DPI, MAX_OCR_DPI)
+        if ok:
+            self.ocr_preprocessor.dpi = value
+
+    def set_use_text_layer(self, checked):
+        self.use_text_layer = checked
+
+    def get_ocr_backend(self):
+        # One backend for the lifetime of the window: credentials, the Drive
+        # service and its connections are reused by every page. Setting
+        # REXMI_OCR_BACKEND=offline swaps in the local stand-in for testing.
+        if self.ocr_backend is None:
+            name = os.environ.get('REXMI_OCR_BACKEND', 'drive')
+            self.ocr_backend = create_backend(name, DriveSession(CLIENT_SECRET_FILE, TOKEN_FILE))
+        return self.ocr_backend
+
+    def run_ocr(self, page_nums):
+        # Drop workers whose threads have fully wound down.
+        self.retired_workers = [w for w in self.retired_workers if not w.isFinished()]
+
+        worker = OCRWorker(self.pdf_doc, page_nums, self.get_ocr_backend(), self.pdf_lock, self.ocr_cache,
+                           self.ocr_preprocessor, self.use_text_layer, self.get_ocr_job(),
+                           self.current_document_key())
+        worker.progress.connect(lambda value, page_nums=page_nums: self.update_progress(page_nums, value))
+        worker.stage.connect(lambda stage, page_nums=page_nums: self.update_stage(page_nums, stage))
+        worker.finished.connect(self.display_result)
+        worker.failed.connect(self.display_failure)
+        for page_num in page_nums:
+            self.ocr_workers[page_num] = worker
+            self.page_progress[page_num] = 0
+            self.page_model.set_state(page_num, PAGE_IN_FLIGHT)
+        worker.start()
+
+    def update_progress(self, page_nums, value):
+        # A batch reports one progress value for all of its pages.
+        page_nums = [page_num for page_num in page_nums if page_num in self.ocr_workers]
+        if not page_nums:
+            return
+        for page_num in page_nums:
+            self.page_progress[page_num] = value
+        if self.full_ocr_in_progress:
+            self.update_full_ocr_progress()
+        elif self.current_page in page_nums:
             self.progress_bar.setValue(value)
 
+    def update_stage(self, page_nums, stage):
+        if not self.full_ocr_in_progress and self.current_page in page_nums:
+            self.progress_bar.setFormat(f"{stage.capitalize()} %p%")
+
+    def update_full_ocr_progress(self):
+        # Completed pages count fully, pages in flight count by their own progress.
+        in_flight = sum(self.page_progress.values())
+        overall_progress = (self.full_ocr_done * 100 + in_flight) // max(self.total_pages, 1)
+        self.progress_bar.setValue(min(overall_progress, 100))
+
     def display_result(self, result, page_num):
-        self.ocr_results[str(page_num)] = result
+        worker = self.ocr_workers.get(page_num)
+        if worker is not None and worker.results[page_num].native:
+            self.text_layer_pages += 1
+        if not self.record_page_result(page_num):
+            self.ocr_page_finished(page_num)
+            return
+        self.set_page_text(str(page_num), result)
+        self.page_model.set_state(page_num, PAGE_DONE)
         if page_num == self.current_page:
-            self.extracted_text.setPlainText(result)
-        self.save_current_text()  # Save the OCR result immediately
+            self.extracted_text.set_page_text(result)
+        self.ocr_page_finished(page_num)
+
+    def display_failure(self, message, page_num):
+        logger.error(f"OCR failed for page {page_num}: {message}")
+        if self.record_page_result(page_num):
+            self.page_model.set_state(page_num, PAGE_FAILED)
+        self.ocr_page_finished(page_num)
+        if not self.full_ocr_in_progress:
+            QMessageBox.warning(self, "OCR Failed", message)
+
+    def ocr_page_finished(self, page_num):
+        self.ocr_rate.mark()
+        self.export_metrics()
+        if not (self.full_ocr_paused or self.full_ocr_cancelled):
+            self.update_status_bar()
+        worker = self.ocr_workers.pop(page_num, None)
+        if worker is not None and worker not in self.ocr_workers.values():
+            self.retired_workers.append(worker)
+        self.page_progress.pop(page_num, None)
 
         if self.full_ocr_in_progress:
-            if page_num < self.total_pages - 1:
-                self.current_page = page_num + 1
-                self.display_page(self.current_page)
-                self.run_ocr(self.current_page)
-            else:
-                self.full_ocr_in_progress = False
-                self.progress_bar.setVisible(False)
-                QMessageBox.information(self, "OCR Complete", "Full OCR process has been completed.")
-        else:
+            self.full_ocr_done += 1
+            self.update_full_ocr_progress()
+            if self.full_ocr_queue and not self.full_ocr_cancelled:
+                self.dispatch_full_ocr()
+            elif not self.ocr_workers:
+                self.finish_full_ocr()
+        elif not self.ocr_workers:
             self.progress_bar.setVisible(False)
 
     def save_project(self):
@@ -437,69 +1304,191 @@ class OCRApp(QMainWindow):
             self.current_project_path = file_path
 
     def _save_project_to_file(self, file_path):
-        self.save_current_text()  # Save the current text before saving the project
-        
-        project_data = {
-            'pdf_content': self.pdf_content,
-            'ocr_results': self.ocr_results
-        }
+        self.extracted_text.flush()  # Save the current text before saving the project
         
-        with open(file_path, 'w') as f:
-            json.dump(project_data, f)
+        full_save = (self.pdf_dirty or file_path != getattr(self, 'current_project_path', None)
+                     or not os.path.exists(file_path) or is_legacy_project(file_path))
+        if full_save:
+            # Rewriting the open project keeps its id; anything else becomes a project of its own.
+            same_project = file_path == getattr(self, 'current_project_path', None)
+            project_id, revision = write_project(file_path, self.pdf_content, self.ocr_results,
+                                                 self.project_id if same_project else None)
+        else:
+            # Same project file: only the pages edited or OCR'd since the last save are written.
+            changed = {page: self.ocr_results[page] for page in self.dirty_pages if page in self.ocr_results}
+            removed = [page for page in self.dirty_pages if page not in self.ocr_results]
+            with ProjectStore(file_path) as store:
+                revision = store.save_pages(changed, removed)
+                project_id = store.project_id()
+        self.pdf_dirty = False
+        self.dirty_pages.clear()
+        # Everything journaled is in the project now; start an empty journal for the new revision.
+        if self.journal:
+            self.journal.discard()
+        self.journal = ProjectJournal.start(file_path, revision)
+        # Search hits now lead to the project, a search document of its own.
+        # A PDF saved as a project moves to it, rather than turning up twice;
+        # another project saved under a new name is still there and stays.
+        search_key = self.current_search_key()
+        was_pdf = not (self.project_id or self.document_name.lower().endswith('.rexmi'))
+        self.document_name = file_path
+        self.project_id = project_id
+        self.search_document_id = None
+        if self.current_search_key() != search_key:
+            if was_pdf and self.search_index is not None:
+                try:
+                    self.search_index.remove_document(search_key)
+                except sqlite3.Error as e:
+                    logger.warning(f"Search index not updated: {str(e)}")
+            self.index_pages(self.ocr_results, replace=True)
+        else:
+            self.index_pages({})
         
         QMessageBox.information(self, "Success", f"Project saved successfully to {file_path}")
 
     def open_project(self):
+        if self.ocr_blocks_switch():
+            return
         file_path, _ = QFileDialog.getOpenFileName(self, "Open Project", "", "REXMI Files (*.rexmi)")
         if file_path:
             self._load_project_from_file(file_path)
 
-    def _load_project_from_file(self, file_path):
-        with open(file_path, 'r') as f:
-            project_data = json.load(f)
-        
-        pdf_content = project_data['pdf_content']
-        pdf_bytes = base64.b64decode(pdf_content)
-        
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_pdf:
-            temp_pdf.write(pdf_bytes)
-            temp_pdf_path = temp_pdf.name
-        
-        self.pdf_doc = fitz.open(temp_pdf_path)
-        
-        # Create a new PDF with an empty first page
-        new_pdf = fitz.open()
-        new_pdf.new_page(width=self.pdf_doc[0].rect.width, height=self.pdf_doc[0].rect.height)
+    def _load_project_from_file(self, file_path, announce=True):
+        self.extracted_text.flush()
+        self.close_journal()
+        recovered = set()
+        if is_legacy_project(file_path):
+            pdf_content, ocr_results = load_legacy_project(file_path)
+            pdf_dirty = True  # rewritten in the current format on the next save
+            project_id = None
+        else:
+            with ProjectStore(file_path) as store:
+                pdf_content = store.read_pdf()
+                ocr_results = store.load_pages()
+                revision = store.revision()
+                project_id = store.project_id()
+            pdf_dirty = False
+            self.journal, recovered = ProjectJournal.open(file_path, revision, ocr_results)
         
-        # Add the pages from the loaded PDF
-        new_pdf.insert_pdf(self.pdf_doc)
+        self.pdf_doc = fitz.open(stream=pdf_content, filetype='pdf')
+        self.set_document(file_path, project_id)
         
-        # Replace the old PDF with the new one
-        self.pdf_doc = new_pdf
+        self.reset_page_cache()
 
         self.pdf_content = pdf_content
-        self.ocr_results = project_data['ocr_results']
+        self.pdf_dirty = pdf_dirty
+        self.ocr_results = ocr_results
+        self.dirty_pages = set(recovered)
+        self.index_pages(ocr_results, replace=True)
         
         self.update_page_list()
         self.display_page(0)  # Display the empty page first
         
         self.current_project_path = file_path
-        QMessageBox.information(self, "Success", f"Project loaded successfully from {file_path}")
+        message = f"Project loaded successfully from {file_path}"
+        if recovered:
+            message += f"\n\nUnsaved changes to {len(recovered)} pages were recovered."
+        if announce or recovered:
+            QMessageBox.information(self, "Success", message)
         self.update_status_bar()
 
     def save_results(self):
-        if not self.ocr_results:
+        self.extracted_text.flush()
+        if not hasattr(self, 'pdf_doc'):
+            QMessageBox.warning(self, "Warning", "No document loaded. Please open a PDF first.")
+            return
+        if self.exporter:
+            QMessageBox.warning(self, "Warning", f"Still exporting to {self.exporter.path}.")
+            return
+        if not self.ocr_results and not self.full_ocr_in_progress:
             QMessageBox.warning(self, "Warning", "No results to save. Please perform OCR first.")
             return
 
-        file_path, _ = QFileDialog.getSaveFileName(self, "Save Results", "", "Text Files (*.txt)")
-        if file_path:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                for page in sorted(self.ocr_results.keys(), key=int):
-                    f.write(self.ocr_results[page])
-                    f.write(' ')  # Add a space between pages instead of a line break
+        file_path, selected = QFileDialog.getSaveFileName(self, "Save Results", "", ";;".join(EXPORT_FILTERS))
+        if not file_path:
+            return
+        fmt = EXPORT_FILTERS[selected] if selected in EXPORT_FILTERS else 'txt'
+        if not file_path.lower().endswith('.' + fmt):
+            file_path += '.' + fmt
+        # Pages a running full OCR has yet to finish are written as they arrive;
+        # everything else goes out now, in page order.
+        awaited = set(self.full_ocr_queue) | set(self.ocr_workers) if self.full_ocr_in_progress else set()
+        if fmt == 'pdf' and not self.check_export_font():
+            return
+        try:
+            exporter = create_exporter(fmt, file_path, range(len(self.pdf_doc)), self.pdf_content, self.export_font)
+            for page_num in range(BLANK_PAGES, self.page_count()):
+                if page_num not in awaited:
+                    exporter.add(page_num - BLANK_PAGES, self.ocr_results.get(str(page_num)))
+        except (OSError, RuntimeError, ValueError) as e:
+            QMessageBox.critical(self, "Error", f"Could not save results: {str(e)}")
+            return
+        self.exporter = exporter
+        if awaited:
+            self.statusBar.showMessage(f"Exporting to {file_path}: {len(awaited)} pages follow as Full OCR finishes them")
+        else:
+            self.finish_export()
 
-            QMessageBox.information(self, "Success", f"Results saved successfully to {file_path}")
+    def finish_export(self):
+        if not self.exporter:
+            return
+        exporter, self.exporter = self.exporter, None
+        try:
+            exporter.close()
+        except (OSError, RuntimeError) as e:
+            QMessageBox.critical(self, "Error", f"Could not save results: {str(e)}")
+            return
+        if exporter.unsupported_pages:
+            QMessageBox.warning(self, "Searchable PDF", f"Results saved to {exporter.path}, but "
+                                f"{len(exporter.unsupported_pages)} pages have characters the PDF font cannot show "
+                                f"({''.join(sorted(exporter.missing_chars))}), so they cannot be searched. "
+                                f"Choose a font that covers them with Searchable PDF Font and save again.")
+            return
+        QMessageBox.information(self, "Success", f"Results saved successfully to {exporter.path} "
+                                                 f"({exporter.written} pages)")
+
+    def check_export_font(self):
+        """False if the searchable PDF should not be written: its font cannot show text already recognised
+        and the user cancelled rather than choose another font or save anyway."""
+        font = fitz.Font(fontfile=self.export_font) if self.export_font else None
+        missing = set()
+        for text in self.ocr_results.values():
+            missing |= missing_glyphs(text or '', font)
+        if not missing:
+            return True
+        font_name = os.path.basename(self.export_font) if self.export_font else "Helvetica (Latin only)"
+        answer = QMessageBox.question(
+            self, "Searchable PDF",
+            f"{font_name} cannot show some characters of the text ({''.join(sorted(missing)[:MISSING_GLYPH_SAMPLE])}), "
+            f"so they would be lost from the PDF's text and could not be searched.\n\n"
+            f"Choose a font that covers them?\n(No saves with {font_name} anyway.)",
+            QMessageBox.Yes | QMessageBox.No | QMessageBox.Cancel, QMessageBox.Yes)
+        if answer == QMessageBox.Yes:
+            return self.choose_export_font()
+        return answer == QMessageBox.No
+
+    def choose_export_font(self):
+        """Let the user pick the searchable PDF font; True if one was chosen."""
+        items = ["Helvetica (Latin only)", "Choose font file..."]
+        item, ok = QInputDialog.getItem(self, "Searchable PDF Font", "Font for the text of searchable PDFs:",
+                                        items, 1 if self.export_font else 0, False)
+        if not ok:
+            return False
+        if item == items[0]:
+            self.export_font = None
+            return True
+        file_path, _ = QFileDialog.getOpenFileName(self, "Searchable PDF Font", "",
+                                                   "Fonts (*.ttf *.otf *.ttc);;All Files (*)")
+        if not file_path:
+            return False
+        try:
+            fitz.Font(fontfile=file_path)
+        except RuntimeError as e:
+            QMessageBox.critical(self, "Error", f"Could not load font {file_path}: {str(e)}")
+            return False
+        self.export_font = file_path
+        self.statusBar.showMessage(f"Searchable PDFs will use {os.path.basename(file_path)}")
+        return True
 
     def increase_font_size(self):
         font = self.extracted_text.font()
@@ -0,0 +1,495 @@
+"""OCR backends: the services that turn a page image into text.
+
+Every backend follows the same three-step protocol as the Google Drive trick
+the app was built on: upload the image as a file to convert, export the
+converted file as plain text, then delete it. ``OCRBackend.recognize`` drives
+those steps (progress reporting included) and subclasses only implement them.
+
+Every remote call goes through a shared ``RequestScheduler``, which keeps
+all workers within a request budget and decides how failed calls are retried.
+
+``DriveBackend`` talks to Google Drive. ``OfflineBackend`` is a local stand-in
+that emulates the same calls with configurable latency, failures and rate
+limits, for load tests and benchmarks without credentials or network.
+"""
+import contextlib
+import datetime
+import hashlib
+import io
+import itertools
+import logging
+import os
+import queue
+import random
+import threading
+import time
+
+import fitz  # PyMuPDF
+from google.oauth2.credentials import Credentials
+from google_auth_oauthlib.flow import InstalledAppFlow
+from google.auth.transport.requests import Request
+from googleapiclient.discovery import build
+from googleapiclient.http import MediaIoBaseUpload, MediaIoBaseDownload
+import google_auth_httplib2
+import httplib2
+
+from ocr_metrics import metrics
+
+import warnings
+warnings.filterwarnings("ignore", message="file_cache is only supported with oauth2client<4.0.0")
+
+logger = logging.getLogger(__name__)
+
+# If modifying these scopes, delete the file token.json.
+SCOPES = ['https://www.googleapis.com/auth/drive.file']
+
+CLIENT_SECRET_FILE = 'client_secret.json'
+TOKEN_FILE = 'token.json'
+
+# Refresh the access token this long before it actually expires so that
+# workers never hit an expired token mid-request.
+TOKEN_REFRESH_MARGIN = datetime.timedelta(minutes=5)
+HTTP_TIMEOUT = 120
+
+# Images up to this size go up in one multipart request; larger ones use a
+# resumable upload, which costs extra round trips but survives dropped links.
+SIMPLE_UPLOAD_LIMIT = 5 * 1024 * 1024
+
+BACKENDS = ('drive', 'offline')
+
+def get_credentials(client_secret_file, token_file=TOKEN_FILE):
+    creds = None
+    if os.path.exists(token_file):
+        creds = Credentials.from_authorized_user_file(token_file, SCOPES)
+    if not creds or not creds.valid:
+        if creds and creds.expired and creds.refresh_token:
+            creds.refresh(Request())
+        else:
+            flow = InstalledAppFlow.from_client_secrets_file(client_secret_file, SCOPES)
+            creds = flow.run_local_server(port=0)
+        with open(token_file, 'w') as token:
+            token.write(creds.to_json())
+    return creds
+
+class DriveSession:
+    """Credentials, Drive service and HTTP connections shared by all OCR workers.
+
+    The discovery-built service is created once. Each request borrows an
+    authorised keep-alive ``httplib2.Http`` from a pool, because a single
+    ``Http`` object is not safe to use from several threads at once. Token
+    loading, the consent flow and refreshes all happen under one lock, so
+    concurrent workers never race to refresh the same token.
+    """
+
+    def __init__(self, client_secret_file=CLIENT_SECRET_FILE, token_file=TOKEN_FILE, timeout=HTTP_TIMEOUT):
+        self.client_secret_file = client_secret_file
+        self.token_file = token_file
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._creds = None
+        self._service = None
+        self._idle_http = queue.LifoQueue()
+
+    def _token_expiring(self):
+        if not self._creds.valid:
+            return True
+        expiry = self._creds.expiry
+        return expiry is not None and expiry - datetime.datetime.utcnow() < TOKEN_REFRESH_MARGIN
+
+    def credentials(self):
+        with self._lock:
+            if self._creds is None:
+                self._creds = get_credentials(self.client_secret_file, self.token_file)
+            elif self._token_expiring() and self._creds.refresh_token:
+                logger.info("Refreshing Drive access token")
+                self._creds.refresh(Request())
+                with open(self.token_file, 'w') as token:
+                    token.write(self._creds.to_json())
+            return self._creds
+
+    def service(self):
+        creds = self.credentials()
+        with self._lock:
+            if self._service is None:
+                self._service = build('drive', 'v3', credentials=creds, cache_discovery=False)
+            return self._service
+
+    @contextlib.contextmanager
+    def http(self):
+        """Borrow an authorised connection; it goes back to the pool afterwards."""
+        creds = self.credentials()
+        try:
+            http = self._idle_http.get_nowait()
+        except queue.Empty:
+            http = google_auth_httplib2.AuthorizedHttp(creds, http=httplib2.Http(timeout=self.timeout))
+        try:
+            yield http
+        finally:
+            self._idle_http.put(http)
+
+class BackendError(Exception):
+    """A backend call failed with an HTTP-style status code."""
+
+    def __init__(self, message, status=None, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+def _no_progress(stage, fraction=0.0):
+    pass
+
+class _NullConnection:
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc_info):
+        return False
+
+# Retry scheduling. Failed calls are classified as retryable (network trouble,
+# 5xx), quota (429, and Drive's 403 rate-limit reasons) or fatal (anything
+# else). Retries back off exponentially with jitter, and a quota error pauses
+# every worker sharing the scheduler, not just the one that hit it.
+RETRYABLE = 'retryable'
+QUOTA = 'quota'
+FATAL = 'fatal'
+RETRYABLE_STATUSES = (408, 500, 502, 503, 504)
+QUOTA_REASONS = ('rateLimitExceeded', 'userRateLimitExceeded')
+DRIVE_REQUEST_RATE = 10.0  # requests per second, well inside Drive's default per-user quota
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+
+def error_status(exc):
+    """HTTP status of a BackendError or googleapiclient HttpError, else None."""
+    if isinstance(exc, BackendError):
+        return exc.status
+    resp = getattr(exc, 'resp', None)
+    return getattr(resp, 'status', None)
+
+def error_retry_after(exc):
+    """Seconds the service asked us to wait, if it said."""
+    if isinstance(exc, BackendError):
+        return exc.retry_after
+    resp = getattr(exc, 'resp', None)
+    try:
+        return float(resp.get('retry-after')) if resp is not None and resp.get('retry-after') else None
+    except (TypeError, ValueError):
+        return None  # an HTTP date; the backoff applies instead
+
+def classify_error(exc):
+    status = error_status(exc)
+    if status == 429:
+        return QUOTA
+    if status == 403:
+        content = getattr(exc, 'content', b'')
+        if isinstance(content, bytes):
+            content = content.decode('utf-8', 'replace')
+        return QUOTA if any(reason in content for reason in QUOTA_REASONS) else FATAL
+    if status in RETRYABLE_STATUSES:
+        return RETRYABLE
+    if status is not None:
+        return FATAL
+    if isinstance(exc, (OSError, httplib2.HttpLib2Error)):
+        return RETRYABLE  # timeouts, resets, DNS
+    return FATAL
+
+class TokenBucket:
+    """Allows ``rate`` acquisitions per second on average, in bursts of up to ``burst``."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst or max(rate, 1))
+        self._tokens = self.burst
+        self._refilled = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Take a token, sleeping until one is available; returns the seconds waited."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._refilled) * self.rate)
+                self._refilled = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+class RequestScheduler:
+    """Request budget, retries and backoff shared by every worker using one backend.
+
+    ``rate`` (requests per second, None for no limit) is enforced with a token
+    bucket across all threads. Each call gets up to ``max_attempts`` tries;
+    fatal errors are raised at once.
+    """
+
+    def __init__(self, rate=None, burst=None, max_attempts=MAX_ATTEMPTS, base_delay=BACKOFF_BASE,
+                 max_delay=BACKOFF_MAX, seed=None):
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        self.max_attempts = max(max_attempts, 1)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._paused_until = 0.0
+
+    def acquire(self):
+        """Block until a request may go out: after any quota pause, then within the budget."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                delay = self._paused_until - time.monotonic()
+            if delay <= 0:
+                break
+            time.sleep(delay)
+            waited += delay
+        if self.bucket:
+            waited += self.bucket.acquire()
+        if waited > 0:
+            metrics.incr('throttled_total')
+            metrics.incr('throttle_seconds_total', waited)
+
+    def backoff(self, attempt, kind, retry_after=None):
+        """Seconds to wait before retry number ``attempt`` (0-based) after an error of class ``kind``."""
+        with self._lock:
+            if retry_after:
+                # Jitter on top, so workers told the same time do not return together.
+                delay = retry_after + self._random.uniform(0, self.base_delay)
+            else:
+                delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+                delay = self._random.uniform(delay / 2, delay)
+            if kind == QUOTA:
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+        return delay
+
+    def call(self, name, fn, *args):
+        """Run one remote call under the budget, retrying it as its errors allow."""
+        for attempt in range(self.max_attempts):
+            self.acquire()
+            metrics.incr('requests_total', call=name)
+            try:
+                return fn(*args)
+            except Exception as e:
+                kind = classify_error(e)
+                metrics.incr('request_errors_total', call=name, kind=kind)
+                if kind == FATAL or attempt == self.max_attempts - 1:
+                    raise
+                delay = self.backoff(attempt, kind, error_retry_after(e))
+                logger.warning(f"{name} failed ({kind}, attempt {attempt + 1}), retrying in {delay:.1f}s: {str(e)}")
+                metrics.incr('retries_total', kind=kind)
+                time.sleep(delay)
+
+class OCRBackend:
+    """Base class for OCR services using the upload / export / delete protocol.
+
+    Subclasses set ``scheduler`` (a RequestScheduler) in their constructor;
+    every remote call goes through it.
+    """
+    name = None
+    scheduler = None
+
+    def cache_settings(self):
+        """Settings that change what this backend returns; they are part of the OCR cache key."""
+        return {'service': self.name}
+
+    def connection(self):
+        """Context manager yielding whatever upload/export/delete need to talk to the service."""
+        return _NullConnection()
+
+    def upload(self, conn, image_data, mimetype, progress):
+        """Create the file to convert and return its id."""
+        raise NotImplementedError
+
+    def export(self, conn, file_id, progress):
+        """Return the converted file's text."""
+        raise NotImplementedError
+
+    def delete(self, conn, file_id):
+        raise NotImplementedError
+
+    def recognize(self, image_data, mimetype='image/png', progress=None):
+        """Return the text in image_data, or None if it could not be converted."""
+        if progress is None:
+            progress = _no_progress
+        try:
+            logger.info("Processing image")
+            with self.connection() as conn:
+                progress('upload')
+                file_id = self.scheduler.call('create', self.upload, conn, image_data, mimetype, progress)
+                metrics.incr('bytes_uploaded_total', len(image_data))
+                progress('upload', 1.0)
+                try:
+                    progress('download')
+                    text = self.scheduler.call('export', self.export, conn, file_id, progress)
+                    metrics.incr('bytes_downloaded_total', len(text.encode('utf-8')))
+                finally:
+                    progress('delete')
+                    try:
+                        self.scheduler.call('delete', self.delete, conn, file_id)
+                    except Exception as e:
+                        # The text is safe; only a stray converted file is left behind.
+                        logger.warning(f"Could not delete converted file {file_id}: {str(e)}")
+                    progress('delete', 1.0)
+                return text
+        except Exception as e:
+            logger.error(f"Error processing image: {str(e)}")
+            return None
+
+class DriveBackend(OCRBackend):
+    """OCR through Google Drive: upload as a Google Doc, export as text/plain."""
+    name = 'drive'
+
+    def __init__(self, session, scheduler=None):
+        self.session = session
+        self.scheduler = scheduler or RequestScheduler(DRIVE_REQUEST_RATE)
+
+    def cache_settings(self):
+        return {'service': 'drive', 'convert_to': 'application/vnd.google-apps.document',
+                'export': 'text/plain'}
+
+    def connection(self):
+        return self.session.http()
+
+    def upload(self, http, image_data, mimetype, progress):
+        service = self.session.service()
+        name = 'temp_batch.pdf' if mimetype == 'application/pdf' else 'temp_image.png'
+        file_metadata = {'name': name, 'mimeType': 'application/vnd.google-apps.document'}
+        resumable = len(image_data) > SIMPLE_UPLOAD_LIMIT
+        media = MediaIoBaseUpload(io.BytesIO(image_data), mimetype=mimetype, resumable=resumable)
+        request = service.files().create(body=file_metadata, media_body=media, fields='id')
+        if not resumable:
+            return request.execute(http=http)['id']
+        file = None
+        while file is None:
+            status, file = request.next_chunk(http=http)
+            if status:
+                progress('upload', status.progress())
+        return file['id']
+
+    def export(self, http, file_id, progress):
+        request = self.session.service().files().export_media(fileId=file_id, mimeType='text/plain')
+        request.http = http
+        fh = io.BytesIO()
+        downloader = MediaIoBaseDownload(fh, request)
+        done = False
+        while done is False:
+            status, done = downloader.next_chunk()
+            if status:
+                progress('download', status.progress())
+        return fh.getvalue().decode('utf-8')
+
+    def delete(self, http, file_id):
+        self.session.service().files().delete(fileId=file_id).execute(http=http)
+
+class OfflineBackend(OCRBackend):
+    """Local stand-in for the Drive backend, for load tests and benchmarks.
+
+    Each create/export/delete call sleeps for ``latency`` seconds (varied by
+    +/- ``jitter``, plus transfer time when ``bandwidth`` bytes/second is set),
+    fails with a 503 with probability ``failure_rate``, and is rejected with a
+    429 and a Retry-After hint once more than ``rate_limit`` calls per second
+    (averaged over a one-second burst) arrive across all threads. The "text"
+    it returns is deterministic filler derived from the image bytes, about as
+    long as a real page, so caching and exports behave realistically. A PDF
+    is converted page by page like Drive does: its text layer is kept and
+    every image on the page contributes filler.
+    """
+    name = 'offline'
+
+    def __init__(self, latency=0.5, jitter=0.25, failure_rate=0.0, rate_limit=None, bandwidth=None, seed=None,
+                 scheduler=None):
+        self.scheduler = scheduler or RequestScheduler(seed=seed)
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.rate_limit = rate_limit
+        self.bandwidth = bandwidth
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._files = {}
+        self._ids = itertools.count(1)
+        self._tokens = float(rate_limit or 0)
+        self._refilled = time.monotonic()
+        self.calls = 0
+        self.failures = 0
+        self.throttled = 0
+
+    def cache_settings(self):
+        return {'service': 'offline'}
+
+    def _call(self, kind, nbytes=0):
+        with self._lock:
+            self.calls += 1
+            if self.rate_limit:
+                now = time.monotonic()
+                self._tokens = min(float(self.rate_limit), self._tokens + (now - self._refilled) * self.rate_limit)
+                self._refilled = now
+                if self._tokens < 1:
+                    self.throttled += 1
+                    retry_after = (1 - self._tokens) / self.rate_limit
+                    raise BackendError(f"Rate limit exceeded on {kind}", status=429, retry_after=retry_after)
+                self._tokens -= 1
+            delay = self.latency * self._random.uniform(1 - self.jitter, 1 + self.jitter)
+            fail = self._random.random() < self.failure_rate
+        if self.bandwidth:
+            delay += nbytes / self.bandwidth
+        time.sleep(max(delay, 0))
+        if fail:
+            with self._lock:
+                self.failures += 1
+            raise BackendError(f"Simulated {kind} failure", status=503)
+
+    def upload(self, conn, image_data, mimetype, progress):
+        self._call('create', len(image_data))
+        with self._lock:
+            file_id = f"offline-{next(self._ids)}"
+            self._files[file_id] = (image_data, mimetype)
+        return file_id
+
+    def export(self, conn, file_id, progress):
+        with self._lock:
+            image_data, mimetype = self._files.get(file_id, (None, None))
+        if image_data is None:
+            raise BackendError(f"File not found: {file_id}", status=404)
+        if mimetype == 'application/pdf':
+            text = self.synthesize_document_text(image_data)
+        else:
+            text = self.synthesize_text(image_data)
+        self._call('export', len(text))
+        progress('download', 1.0)
+        return text
+
+    def delete(self, conn, file_id):
+        self._call('delete')
+        with self._lock:
+            self._files.pop(file_id, None)
+
+    @staticmethod
+    def synthesize_text(image_data):
+        seed = hashlib.sha256(image_data).digest()
+        rng = random.Random(seed)
+        words = ['lorem', 'ipsum', 'dolor', 'sit', 'amet', 'consectetur', 'adipiscing', 'elit', 'sed', 'do',
+                 'eiusmod', 'tempor', 'incididunt', 'ut', 'labore', 'et', 'dolore', 'magna', 'aliqua']
+        count = min(600, 40 + len(image_data) // 1000)
+        return ' '.join(rng.choice(words) for _ in range(count)) + '.'
+
+    @classmethod
+    def synthesize_document_text(cls, pdf_data):
+        parts = []
+        with fitz.open(stream=pdf_data, filetype='pdf') as doc:
+            for page in doc:
+                parts.append(page.get_text().strip())
+                parts.extend(cls.synthesize_text(doc.extract_image(image[0])['image'])
+                             for image in page.get_images())
+        return '\n'.join(parts)
+
+def create_backend(name, session=None, scheduler=None, **options):
+    """Build a backend by name; the Drive backend needs a DriveSession."""
+    if name == 'drive':
+        return DriveBackend(session or DriveSession(), scheduler)
+    if name == 'offline':
+        return OfflineBackend(scheduler=scheduler, **options)
+    raise ValueError(f"Unknown OCR backend: {name}")
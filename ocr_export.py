@@ -0,0 +1,208 @@
+"""Streaming export of OCR results to plain text, JSON lines or a searchable PDF.
+
+An exporter is opened for a document's pages before they are all known and
+is fed pages in any order as OCR finishes them. Pages are written in page
+order as soon as every earlier page has arrived; only pages that arrived
+ahead of a gap are held back, so memory stays flat however long the document
+is. Pages that never arrive are left out (the searchable PDF keeps them,
+without text).
+"""
+import json
+import logging
+import math
+import os
+import shutil
+from collections import deque
+
+import fitz  # PyMuPDF
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = ('txt', 'jsonl', 'pdf')
+TEXT_PAGE_MARKER = "=== Page {page} ==="
+
+# Searchable PDF: the recognised text goes over each page as invisible text
+# (render mode 3) filling the page, so viewers can search and select it. The
+# Base-14 Helvetica only covers Latin-1; pass a TrueType/OpenType font for
+# other scripts. Characters the font cannot show are lost from the text
+# layer, so exporters count the pages that have any (see missing_glyphs).
+PDF_TEXT_FONT = 'helv'
+MISSING_GLYPH_SAMPLE = 8  # characters kept to name in warnings
+PDF_TEXT_MAX_SIZE = 11.0
+PDF_TEXT_LINE_HEIGHT = 1.2
+# Space above the first line, in font sizes. Fonts whose ascender is taller
+# than the size would otherwise reach above the page, and text extraction
+# drops characters outside the page.
+PDF_TEXT_TOP_MARGIN = 0.5
+PDF_FLUSH_PAGES = 50  # pages between incremental saves, which release the pages held in memory
+
+class PageExporter:
+    """Base class: orders the pages fed to ``add`` and hands them to ``_emit`` one at a time."""
+
+    def __init__(self, path, page_nums):
+        self.path = path
+        self.expected = deque(sorted(page_nums))
+        self.waiting = {}  # page_num -> (text, error, meta) that arrived ahead of an earlier page
+        self.written = 0
+        self.unsupported_pages = []  # pages whose text the output cannot fully represent
+        self.missing_chars = set()  # a sample of the characters it could not
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def add(self, page_num, text, error=None, **meta):
+        """Add one page (0-based); text None and no error means the page has no result and is passed over."""
+        if self.expected and page_num < self.expected[0]:
+            return  # already written or passed over
+        self.waiting[page_num] = (text, error, meta)
+        while self.expected and self.expected[0] in self.waiting:
+            self._write(self.expected.popleft())
+
+    def add_result(self, result):
+        """Add a PageResult from ocr_pipeline."""
+        self.add(result.page_num, result.text, result.error, cached=result.cached, text_layer=result.native,
+                 seconds=round(result.elapsed, 3))
+
+    def pending(self):
+        """Number of expected pages not written yet."""
+        return len(self.expected)
+
+    def _write(self, page_num):
+        text, error, meta = self.waiting.pop(page_num)
+        if text is None and error is None:
+            return
+        self._emit(page_num, text, error, meta)
+        self.written += 1
+
+    def close(self):
+        """Write whatever arrived out of order, passing over the pages that never did, and finish the file."""
+        self.expected.clear()
+        for page_num in sorted(self.waiting):
+            self._write(page_num)
+        self._finish()
+
+    def _emit(self, page_num, text, error, meta):
+        raise NotImplementedError
+
+    def _finish(self):
+        raise NotImplementedError
+
+class TextExporter(PageExporter):
+    """Plain text, each page headed by a TEXT_PAGE_MARKER line; failed pages get the marker alone."""
+
+    def __init__(self, path, page_nums):
+        super().__init__(path, page_nums)
+        self.file = open(path, 'w', encoding='utf-8')
+
+    def _emit(self, page_num, text, error, meta):
+        text = text or ''
+        self.file.write(TEXT_PAGE_MARKER.format(page=page_num + 1) + '\n')
+        self.file.write(text if text.endswith('\n') or not text else text + '\n')
+        self.file.flush()  # readable while the export is still running
+
+    def _finish(self):
+        self.file.close()
+
+class JsonlExporter(PageExporter):
+    """One JSON object per page: page (1-based), text, error, chars and whatever metadata came with it."""
+
+    def __init__(self, path, page_nums):
+        super().__init__(path, page_nums)
+        self.file = open(path, 'w', encoding='utf-8')
+
+    def _emit(self, page_num, text, error, meta):
+        record = {'page': page_num + 1, 'text': text, 'error': error, 'chars': len(text or '')}
+        record.update(meta)
+        self.file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.file.flush()
+
+    def _finish(self):
+        self.file.close()
+
+class PdfExporter(PageExporter):
+    """The source PDF with each page's text laid over it invisibly.
+
+    The output starts as a byte copy of the source (``source`` is a path or
+    the PDF bytes), so every page is kept as it is, and the text is added
+    with incremental saves every PDF_FLUSH_PAGES pages. Reopening the file
+    after each save keeps only a bounded number of pages in memory.
+    """
+
+    def __init__(self, path, page_nums, source, fontfile=None):
+        super().__init__(path, page_nums)
+        if isinstance(source, (bytes, bytearray)):
+            with open(path, 'wb') as f:
+                f.write(source)
+        else:
+            shutil.copyfile(source, path)
+        self.doc = fitz.open(path)
+        if not self.doc.can_save_incrementally():
+            # Repaired or encrypted on open: write it out cleanly once so it can be appended to.
+            temp_path = path + '.tmp'
+            self.doc.save(temp_path)
+            self.doc.close()
+            os.replace(temp_path, path)
+            self.doc = fitz.open(path)
+        self.fontfile = fontfile
+        self.fontname = 'ocrtext' if fontfile else PDF_TEXT_FONT
+        self.font = fitz.Font(fontfile=fontfile) if fontfile else fitz.Font(PDF_TEXT_FONT)
+        self.unsaved = 0
+
+    def _emit(self, page_num, text, error, meta):
+        if not text or not text.strip():
+            return
+        missing = missing_glyphs(text, self.font if self.fontfile else None)
+        if missing:
+            self.unsupported_pages.append(page_num)
+            self.missing_chars.update(sorted(missing)[:MISSING_GLYPH_SAMPLE - len(self.missing_chars)])
+        add_invisible_text(self.doc[page_num], text, self.font, self.fontname, self.fontfile)
+        self.unsaved += 1
+        if self.unsaved >= PDF_FLUSH_PAGES:
+            self._save()
+            self.doc.close()
+            self.doc = fitz.open(self.path)
+
+    def _save(self):
+        if self.unsaved:
+            self.doc.saveIncr()
+            self.unsaved = 0
+
+    def _finish(self):
+        self._save()
+        self.doc.close()
+
+def missing_glyphs(text, font=None):
+    """Characters of text the PDF font cannot show: beyond Latin-1 for Base-14 (font None), else without a glyph."""
+    chars = {c for c in text if not c.isspace()}
+    if font is None:
+        return {c for c in chars if ord(c) > 0xFF}
+    return {c for c in chars if not font.has_glyph(ord(c))}
+
+def add_invisible_text(page, text, font, fontname=PDF_TEXT_FONT, fontfile=None):
+    """Fill the page with text in render mode 3, at the largest size (up to PDF_TEXT_MAX_SIZE) that fits."""
+    rect = page.rect
+    # Start from the size at which the text's area roughly equals the page's
+    # and shrink until insert_textbox takes it (it writes nothing if not).
+    width = max(font.text_length(text, fontsize=1.0), 1.0)
+    size = min(PDF_TEXT_MAX_SIZE, math.sqrt(rect.width * rect.height / (width * PDF_TEXT_LINE_HEIGHT)))
+    while size > 0.5:
+        box = fitz.Rect(rect.x0, rect.y0 + size * PDF_TEXT_TOP_MARGIN, rect.x1, rect.y1)
+        if page.insert_textbox(box, text, fontname=fontname, fontfile=fontfile, fontsize=size,
+                               lineheight=PDF_TEXT_LINE_HEIGHT, render_mode=3) >= 0:
+            return True
+        size *= 0.85
+    logger.warning(f"Text of page {page.number + 1} does not fit on the page; left out of the PDF")
+    return False
+
+def create_exporter(fmt, path, page_nums, source=None, fontfile=None):
+    """An exporter for one of EXPORT_FORMATS; 'pdf' needs the source document (path or bytes)."""
+    if fmt == 'txt':
+        return TextExporter(path, page_nums)
+    if fmt == 'jsonl':
+        return JsonlExporter(path, page_nums)
+    if fmt == 'pdf':
+        return PdfExporter(path, page_nums, source, fontfile)
+    raise ValueError(f"Unknown export format: {fmt}")
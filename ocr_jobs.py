@@ -0,0 +1,147 @@
+"""Durable manifests for long OCR runs, so they can be resumed after any interruption.
+
+Each document gets one small SQLite file under DATA_DIR/jobs, named after the
+SHA-256 of the PDF bytes, so the same document is recognised whatever it is
+called or wherever it lives. Every page's state (pending, done or failed) and
+its text or error are written the moment the page completes. A run that
+stops halfway, whether from a crash, an expired token or Ctrl+C, can then
+carry on with just the pages that are missing, or retry only the pages that
+failed, and a page range can be re-run on its own.
+"""
+import hashlib
+import os
+import sqlite3
+import time
+
+from ocr_pipeline import DATA_DIR
+
+JOBS_DIR = os.path.join(DATA_DIR, 'jobs')
+
+JOB_PENDING = 'pending'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS pages (
+    page INTEGER PRIMARY KEY,
+    state TEXT NOT NULL,
+    text TEXT,
+    error TEXT,
+    source TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    updated REAL
+);
+"""
+
+def document_key(pdf_bytes):
+    return hashlib.sha256(pdf_bytes).hexdigest()
+
+def file_key(path):
+    """document_key of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def parse_page_range(spec, page_count):
+    """0-based page numbers for a 1-based spec like '1-10,15,40-'; raises ValueError if malformed."""
+    pages = set()
+    for part in spec.replace(' ', '').split(','):
+        if not part:
+            continue
+        first, dash, last = part.partition('-')
+        try:
+            first = int(first) if first else 1
+            last = int(last) if last else None if dash else first
+        except ValueError:
+            raise ValueError(f"Invalid page range: {part}") from None
+        if first < 1 or (last is not None and last < first):
+            raise ValueError(f"Invalid page range: {part}")
+        pages.update(range(first - 1, page_count if last is None else min(last, page_count)))
+    return sorted(pages)
+
+def manifest_path(key, jobs_dir=JOBS_DIR):
+    """Where the manifest of the document with this key is kept, whether or not it exists yet."""
+    return os.path.join(jobs_dir, key + '.sqlite')
+
+class JobManifest:
+    """Per-page OCR state of one document, written through as pages complete.
+
+    Pages are document pages, 0-based. Pages that were in flight when a run
+    stopped are still pending. Not thread-safe: record results from one
+    thread (the batch loop or the GUI thread).
+    """
+
+    def __init__(self, key, page_count, name='', jobs_dir=JOBS_DIR):
+        os.makedirs(jobs_dir, exist_ok=True)
+        self.key = key
+        self.path = manifest_path(key, jobs_dir)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute('PRAGMA journal_mode = WAL')
+        self.conn.execute('PRAGMA synchronous = NORMAL')
+        with self.conn:
+            self.conn.executescript(SCHEMA)
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('name', ?)", (name,))
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('page_count', ?)", (str(page_count),))
+            self.conn.executemany('INSERT OR IGNORE INTO pages (page, state) VALUES (?, ?)',
+                                  ((page, JOB_PENDING) for page in range(page_count)))
+        self.page_count = page_count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def record(self, result):
+        """Store a PageResult as the page's outcome."""
+        if result.ok:
+            source = 'text-layer' if result.native else 'cache' if result.cached else 'ocr'
+            row = (JOB_DONE, result.text, None, source)
+        else:
+            row = (JOB_FAILED, None, result.error, None)
+        with self.conn:
+            self.conn.execute('UPDATE pages SET state = ?, text = ?, error = ?, source = ?, '
+                              'attempts = attempts + 1, updated = ? WHERE page = ?',
+                              row + (time.time(), result.page_num))
+
+    def reset(self, pages):
+        """Mark pages pending again, forgetting their results."""
+        with self.conn:
+            self.conn.executemany("UPDATE pages SET state = ?, text = NULL, error = NULL WHERE page = ?",
+                                  ((JOB_PENDING, page) for page in pages))
+
+    def pages(self, *states):
+        """Pages in any of the given states, in order."""
+        marks = ', '.join('?' * len(states))
+        return [page for page, in self.conn.execute(
+            f'SELECT page FROM pages WHERE state IN ({marks}) AND page < ? ORDER BY page',
+            states + (self.page_count,))]
+
+    def results(self):
+        """{page: text} of every page done so far."""
+        return dict(self.conn.execute('SELECT page, text FROM pages WHERE state = ? AND page < ?',
+                                      (JOB_DONE, self.page_count)))
+
+    def errors(self):
+        return dict(self.conn.execute('SELECT page, error FROM pages WHERE state = ? AND page < ?',
+                                      (JOB_FAILED, self.page_count)))
+
+    def counts(self):
+        counts = {JOB_PENDING: 0, JOB_DONE: 0, JOB_FAILED: 0}
+        counts.update(self.conn.execute('SELECT state, COUNT(*) FROM pages WHERE page < ? GROUP BY state',
+                                        (self.page_count,)))
+        return counts
+
+    def started(self):
+        """True once any page has an outcome."""
+        counts = self.counts()
+        return bool(counts[JOB_DONE] or counts[JOB_FAILED])
+
+    def complete(self):
+        return self.counts()[JOB_DONE] == self.page_count
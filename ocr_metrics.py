@@ -0,0 +1,204 @@
+"""Hot-path instrumentation for the OCR pipeline.
+
+``metrics`` is the process-wide registry. It is disabled by default and every
+recording call returns immediately in that state, so the pipeline can call it
+unconditionally. Once enabled it keeps counters and per-stage latency
+histograms, can append one JSON line per timed span to a trace file, and can
+write everything out in the Prometheus text exposition format (for the node
+exporter's textfile collector, for example).
+
+Set REXMI_OCR_TRACE and/or REXMI_OCR_METRICS to file paths to enable it in the
+GUI; the batch command line has --trace and --metrics.
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# Upper bounds (seconds) of the stage latency histogram buckets.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+METRIC_PREFIX = 'rexmi_ocr_'
+
+COUNTER_HELP = {
+    'pages_total': "Pages finished, by status.",
+    'cache_hits_total': "Pages served from the OCR result cache.",
+    'cache_misses_total': "Pages that had to go to the OCR backend.",
+    'requests_total': "Remote backend calls, by call.",
+    'request_errors_total': "Failed backend calls, by call and error class.",
+    'retries_total': "Failed backend calls that were retried, by error class.",
+    'throttled_total': "Backend calls held back by the request budget or a quota pause.",
+    'throttle_seconds_total': "Time backend calls spent held back by the request budget or a quota pause.",
+    'bytes_uploaded_total': "Image bytes uploaded to the OCR backend.",
+    'bytes_downloaded_total': "Text bytes downloaded from the OCR backend.",
+    'text_layer_pages_total': "Pages read from the PDF's own text layer instead of OCR.",
+    'batches_total': "Multi-page batch uploads sent to the OCR backend.",
+    'batch_fallbacks_total': "Batches whose text could not be split and were resent page by page.",
+    'image_unreduced_bytes_total': "Size of the rendered page images as PNG, before cropping and reduction (with --measure-savings).",
+    'image_bytes_total': "Size of the page images after preprocessing and encoding.",
+}
+
+def _labels_key(labels):
+    return tuple(sorted(labels.items()))
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in pairs) + '}'
+
+class Metrics:
+    """Counters, stage histograms and an optional JSON-lines span trace."""
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._counters = {}  # (name, labels_key) -> value
+        self._histograms = {}  # labels_key -> [bucket counts..., +Inf count, sum]
+        self._trace = None
+        self._prometheus_path = None
+        # Spans are timed with time.monotonic(); this turns them into wall-clock times.
+        self._wall_offset = time.time() - time.monotonic()
+
+    def enable(self, trace_path=None, prometheus_path=None):
+        with self._lock:
+            if trace_path and self._trace is None:
+                self._trace = open(trace_path, 'a', encoding='utf-8')
+            self._prometheus_path = prometheus_path or self._prometheus_path
+            self.enabled = True
+
+    def configure_from_env(self):
+        trace_path = os.environ.get('REXMI_OCR_TRACE')
+        prometheus_path = os.environ.get('REXMI_OCR_METRICS')
+        if trace_path or prometheus_path:
+            self.enable(trace_path, prometheus_path)
+
+    def close(self):
+        self.write_prometheus()
+        with self._lock:
+            if self._trace is not None:
+                self._trace.close()
+                self._trace = None
+            self.enabled = False
+
+    def incr(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, _labels_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, stage, seconds):
+        if not self.enabled:
+            return
+        key = _labels_key({'stage': stage})
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [0] * (len(LATENCY_BUCKETS) + 1) + [0.0]
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    histogram[i] += 1
+                    break
+            else:
+                histogram[len(LATENCY_BUCKETS)] += 1
+            histogram[-1] += seconds
+
+    def trace(self, name, start, end, **attrs):
+        """Append one span (monotonic start/end) to the trace file."""
+        if not self.enabled or self._trace is None:
+            return
+        event = {'name': name, 'ts': round(start + self._wall_offset, 6), 'dur': round(end - start, 6),
+                 'thread': threading.current_thread().name}
+        event.update(attrs)
+        line = json.dumps(event, ensure_ascii=False)
+        with self._lock:
+            if self._trace is not None:
+                self._trace.write(line + '\n')
+                self._trace.flush()
+
+    def record_page(self, result, spans, start, end, **attrs):
+        """Record a finished page: its stage spans, latency histograms and status counter."""
+        if not self.enabled:
+            return
+        for stage, span_start, span_end in spans:
+            self.observe(stage, span_end - span_start)
+            self.trace(stage, span_start, span_end, page=result.page_num, **attrs)
+        self.observe('total', end - start)
+        self.trace('page', start, end, page=result.page_num, ok=result.ok, cached=result.cached,
+                   native=result.native, error=result.error, **attrs)
+        self.incr('pages_total', status='ok' if result.ok else 'failed')
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._counters), {key: list(value) for key, value in self._histograms.items()}
+
+    def prometheus_text(self):
+        counters, histograms = self.snapshot()
+        lines = []
+        names = sorted({name for name, _ in counters})
+        for name in names:
+            metric = METRIC_PREFIX + name
+            if name in COUNTER_HELP:
+                lines.append(f"# HELP {metric} {COUNTER_HELP[name]}")
+            lines.append(f"# TYPE {metric} counter")
+            for (counter_name, labels), value in sorted(counters.items()):
+                if counter_name == name:
+                    lines.append(f"{metric}{_format_labels(labels)} {value}")
+        if histograms:
+            metric = METRIC_PREFIX + 'stage_seconds'
+            lines.append(f"# HELP {metric} Time spent per pipeline stage of a page.")
+            lines.append(f"# TYPE {metric} histogram")
+            for labels, histogram in sorted(histograms.items()):
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS, histogram):
+                    cumulative += count
+                    lines.append(f"{metric}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+                cumulative += histogram[len(LATENCY_BUCKETS)]
+                lines.append(f"{metric}_bucket{_format_labels(labels, [('le', '+Inf')])} {cumulative}")
+                lines.append(f"{metric}_sum{_format_labels(labels)} {histogram[-1]:.6f}")
+                lines.append(f"{metric}_count{_format_labels(labels)} {cumulative}")
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path=None):
+        """Write the current values atomically (so a scraper never sees half a file)."""
+        path = path or self._prometheus_path
+        if not self.enabled or not path:
+            return
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(self.prometheus_text())
+        os.replace(temp_path, path)
+
+class RateMeter:
+    """Completions per minute over a sliding window, for live progress displays."""
+
+    def __init__(self, window=60.0):
+        self.window = window
+        self._times = deque()
+        self._lock = threading.Lock()
+
+    def mark(self, count=1):
+        now = time.monotonic()
+        with self._lock:
+            self._times.extend([now] * count)
+            self._trim(now)
+
+    def _trim(self, now):
+        while self._times and now - self._times[0] > self.window:
+            self._times.popleft()
+
+    def per_minute(self):
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            if len(self._times) < 2:
+                return 0.0
+            span = max(now - self._times[0], 1.0)
+            return len(self._times) * 60.0 / span
+
+    def reset(self):
+        with self._lock:
+            self._times.clear()
+
+metrics = Metrics()
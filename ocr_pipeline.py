@@ -0,0 +1,641 @@
+"""OCR pipeline shared by the desktop app and the batch command line.
+
+Renders PDF pages with PyMuPDF, sends them to an OCR backend (see
+ocr_backends) and returns the recognised text. Pages that already have a
+usable text layer are read locally instead. Nothing here imports PyQt5, so
+headless tools can use it without a display.
+"""
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter, OrderedDict
+
+import fitz  # PyMuPDF
+
+from ocr_metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Number of pages Full OCR keeps in flight at once. Pages are independent and
+# each one is dominated by Drive round trips, so a few parallel workers cut the
+# wall-clock time roughly by this factor.
+DEFAULT_OCR_CONCURRENCY = 4
+MAX_OCR_CONCURRENCY = 16
+
+DATA_DIR = os.path.join(os.path.expanduser('~'), '.rexmi_ocr')
+OCR_CACHE_DIR = os.path.join(DATA_DIR, 'cache')
+OCR_CACHE_LIMIT = 256 * 1024 * 1024
+
+class OCRCache:
+    """Persistent OCR text cache addressed by the page image and OCR settings.
+
+    Each entry is one small file named after the SHA-256 of the encoded page
+    image plus the OCR settings, so the same page seen in another project or a
+    repeated Full OCR never goes back to Drive. The raw service text is stored
+    (before ``clean_text``). Total size is capped and the least recently used
+    entries are evicted; file access times are bumped on hits so the order
+    survives restarts. Safe to share between worker threads.
+    """
+
+    def __init__(self, directory=OCR_CACHE_DIR, max_bytes=OCR_CACHE_LIMIT):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> size in bytes, least recently used first
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+        self._scan()
+
+    @staticmethod
+    def make_key(image_data, settings):
+        digest = hashlib.sha256()
+        digest.update(json.dumps(settings, sort_keys=True).encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(image_data)
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + '.txt')
+
+    def _scan(self):
+        found = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith('.txt'):
+                    continue
+                with contextlib.suppress(OSError):
+                    st = os.stat(os.path.join(root, name))
+                    found.append((st.st_mtime, name[:-4], st.st_size))
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self._size += size
+        self._evict()
+
+    def _evict(self):
+        while self._size > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._size -= size
+            self.evictions += 1
+            with contextlib.suppress(OSError):
+                os.remove(self._path(key))
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                text = f.read()
+            os.utime(path)
+        except OSError:
+            # Removed behind our back (another process evicted it, or a manual clean-up).
+            with self._lock:
+                self._size -= self._entries.pop(key, 0)
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return text
+
+    def put(self, key, text):
+        data = text.encode('utf-8')
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+        with self._lock:
+            self._size += len(data) - self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            for key in self._entries:
+                with contextlib.suppress(OSError):
+                    os.remove(self._path(key))
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'entries': len(self._entries), 'bytes': self._size}
+
+# Pipeline stages of a single page and their share of the page's progress bar.
+# The weights roughly follow where the time goes: the Drive round trips dominate.
+PROGRESS_STAGES = (
+    ('classify', 0),
+    ('render', 5),
+    ('preprocess', 5),
+    ('encode', 5),
+    ('cache', 0),
+    ('upload', 40),
+    ('download', 35),
+    ('delete', 10),
+    ('clean', 0),
+)
+
+class PipelineProgress:
+    """Turns (stage, fraction) reports from the OCR pipeline into a 0-100 value.
+
+    The callback receives ``(stage, percent)`` and is called only when the
+    overall percentage actually moves, so it is cheap to report often.
+    Wall-clock time spent in each stage is accumulated in ``timings`` and
+    every (stage, start, end) interval is kept in ``spans``.
+    """
+
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.offsets = {}
+        self.weights = {}
+        offset = 0
+        for stage, weight in PROGRESS_STAGES:
+            self.offsets[stage] = offset
+            self.weights[stage] = weight
+            offset += weight
+        self.total = offset
+        self.percent = -1
+        self.stage = None
+        self.timings = {}
+        self.spans = []
+        self.stage_started = None
+
+    def _end_stage(self, now):
+        if self.stage_started is not None:
+            self.timings[self.stage] = self.timings.get(self.stage, 0.0) + now - self.stage_started
+            self.spans.append((self.stage, self.stage_started, now))
+
+    def __call__(self, stage, fraction=0.0):
+        if stage != self.stage:
+            now = time.monotonic()
+            self._end_stage(now)
+            self.stage_started = now
+        fraction = min(max(fraction, 0.0), 1.0)
+        if self.weights[stage] == 0 and self.percent >= 0:
+            # Bookkeeping stages (cache, clean) can happen anywhere; they don't move the bar.
+            percent = self.percent
+        else:
+            percent = (self.offsets[stage] + self.weights[stage] * fraction) * 100 // self.total
+        if percent == self.percent and stage == self.stage:
+            return
+        self.percent = int(percent)
+        self.stage = stage
+        if self.callback:
+            self.callback(stage, self.percent)
+
+    def finish(self):
+        """Close the running stage's timing without reporting completion."""
+        self._end_stage(time.monotonic())
+        self.stage_started = None
+
+    def done(self):
+        self.finish()
+        self.percent = 100
+        self.stage = 'done'
+        if self.callback:
+            self.callback('done', 100)
+
+def encode_pixmap(pix):
+    """Encode a PyMuPDF pixmap as PNG bytes without touching the disk."""
+    return pix.tobytes('png')
+
+def clean_text(text):
+    cleaned = text.replace(' )', ')').replace('( ', '(').replace('.', '. ').replace(',', ', ')
+    cleaned = ' '.join(cleaned.split())
+    return cleaned
+
+# Page image preprocessing. Drive's OCR needs neither colour nor the blank paper
+# around the text, and most book pages are black ink on white, so the page is
+# rendered in grayscale, reduced to pure black and white when it has few
+# midtones, and cropped to its content before being encoded as PNG.
+COLOR_MODES = ('auto', 'gray', 'bilevel', 'color')
+DEFAULT_OCR_DPI = 150  # pages drawn from text and vector graphics
+MIN_OCR_DPI = 100
+MAX_OCR_DPI = 300  # scans are rendered at their own resolution up to this
+MAX_OCR_PIXELS = 24 * 1024 * 1024  # larger pages are rendered at a lower resolution
+SCAN_COVERAGE = 0.8  # an image covering this much of the page makes it a scan
+HISTOGRAM_STEP = 16  # analyse every 16th pixel; plenty for a histogram
+BILEVEL_MIDTONES = 0.1  # at most this fraction of midtone pixels for black and white
+CROP_PADDING = 0.1  # inches of white kept around the cropped content
+
+def _threshold_table(threshold, below, above):
+    return bytes(below if value < threshold else above for value in range(256))
+
+def otsu_threshold(histogram):
+    """Gray level that best separates ink from paper in a 256-bin histogram."""
+    total = sum(histogram)
+    weighted_total = sum(value * count for value, count in enumerate(histogram))
+    best, best_variance = 128, -1.0
+    background = weighted_background = 0
+    for value, count in enumerate(histogram):
+        background += count
+        if background == 0:
+            continue
+        foreground = total - background
+        if foreground == 0:
+            break
+        weighted_background += value * count
+        mean_background = weighted_background / background
+        mean_foreground = (weighted_total - weighted_background) / foreground
+        variance = background * foreground * (mean_background - mean_foreground) ** 2
+        if variance > best_variance:
+            best, best_variance = value + 1, variance
+    return best
+
+def content_box(mask, width, height, stride):
+    """Bounding box (x0, y0, x1, y1) of the 1 bytes in a row-major mask, or None if there are none."""
+    first = mask.find(1)
+    if first < 0:
+        return None
+    last = mask.rfind(1)
+    y0, y1 = first // stride, last // stride + 1
+    x0, x1 = width, 0
+    for y in range(y0, y1):
+        row = y * stride
+        left = mask.find(1, row, row + width)
+        if left >= 0:
+            x0 = min(x0, left - row)
+            x1 = max(x1, mask.rfind(1, row, row + width) - row + 1)
+    return x0, y0, x1, y1
+
+class PagePreprocessor:
+    """Renders a page and turns it into the smallest image that still OCRs well.
+
+    Per page it picks the render resolution (the scan's own resolution for
+    image pages, ``dpi`` for everything else), the colour mode and the crop.
+    ``color_mode`` is 'auto' (gray, or black and white for pages with few
+    midtones), 'gray', 'bilevel' or 'color' (the page as rendered, uncropped).
+    A running total of encoded bytes is kept for ``stats``. With
+    ``measure_savings`` every reduced page is also encoded as it was rendered,
+    to total what the pages would have been without cropping or reduction;
+    that second encode costs more than the reduction itself, so it is off
+    unless asked for. Safe to share between worker threads; only ``render``
+    touches the document, so only it needs the document's lock.
+    """
+
+    def __init__(self, dpi=DEFAULT_OCR_DPI, max_dpi=MAX_OCR_DPI, color_mode='auto', crop_margins=True,
+                 measure_savings=False):
+        if color_mode not in COLOR_MODES:
+            raise ValueError(f"Unknown colour mode: {color_mode}")
+        self.dpi = dpi
+        self.max_dpi = max(max_dpi, dpi)
+        self.color_mode = color_mode
+        self.crop_margins = crop_margins
+        self.measure_savings = measure_savings
+        self._lock = threading.Lock()
+        self.pages = 0
+        self.unreduced_bytes = 0
+        self.encoded_bytes = 0
+
+    def cache_settings(self):
+        return {'dpi': self.dpi, 'max_dpi': self.max_dpi, 'color_mode': self.color_mode,
+                'crop_margins': self.crop_margins, 'image_format': 'png'}
+
+    def page_dpi(self, page):
+        """Render resolution for one page: scans keep their own resolution, within limits."""
+        dpi = self.dpi
+        page_area = abs(page.rect)
+        for image in page.get_image_info():
+            box = fitz.Rect(image['bbox'])
+            if page_area and abs(box & page.rect) >= SCAN_COVERAGE * page_area and box.width:
+                native = image['width'] * 72.0 / box.width
+                dpi = min(max(native, MIN_OCR_DPI), self.max_dpi)
+                break
+        pixels = page.rect.width * page.rect.height * (dpi / 72.0) ** 2
+        if pixels > MAX_OCR_PIXELS:
+            dpi *= (MAX_OCR_PIXELS / pixels) ** 0.5
+        return int(dpi)
+
+    def render(self, page):
+        colorspace = fitz.csRGB if self.color_mode == 'color' else fitz.csGRAY
+        return page.get_pixmap(dpi=self.page_dpi(page), colorspace=colorspace, alpha=False)
+
+    def prepare(self, pix):
+        """Return (pixmap, info): the rendered page reduced and cropped for OCR."""
+        info = {'dpi': pix.xres, 'width': pix.width, 'height': pix.height, 'mode': 'color', 'cropped': False}
+        if self.color_mode != 'color':
+            reduced = self._reduce(pix, info)
+            if self.measure_savings and reduced is not pix:
+                # The baseline for the savings: the page as rendered, at the same DPI, in PNG.
+                info['unreduced_bytes'] = len(encode_pixmap(pix))
+            pix = reduced
+        return pix, info
+
+    def encode(self, pix, info):
+        image_data = encode_pixmap(pix)
+        info['bytes'] = len(image_data)
+        if self.measure_savings:
+            info.setdefault('unreduced_bytes', len(image_data))
+        with self._lock:
+            self.pages += 1
+            self.unreduced_bytes += info.get('unreduced_bytes', 0)
+            self.encoded_bytes += len(image_data)
+        return image_data
+
+    def _reduce(self, pix, info):
+        samples = pix.samples
+        width, height, stride = pix.width, pix.height, pix.stride
+        histogram = [0] * 256
+        for value, count in Counter(samples[::HISTOGRAM_STEP]).items():
+            histogram[value] = count
+        threshold = min(max(otsu_threshold(histogram), 64), 224)
+        midtones = sum(histogram[64:192]) / max(sum(histogram), 1)
+        mode = self.color_mode
+        if mode == 'auto':
+            mode = 'bilevel' if midtones <= BILEVEL_MIDTONES else 'gray'
+        info['mode'] = mode
+        changed = False
+
+        if self.crop_margins:
+            box = content_box(samples.translate(_threshold_table(threshold, 1, 0)), width, height, stride)
+            if box is not None:
+                pad = int(CROP_PADDING * pix.xres)
+                x0, y0 = max(box[0] - pad, 0), max(box[1] - pad, 0)
+                x1, y1 = min(box[2] + pad, width), min(box[3] + pad, height)
+                if (x1 - x0) * (y1 - y0) < width * height:
+                    samples = b''.join(samples[y * stride + x0:y * stride + x1] for y in range(y0, y1))
+                    width, height, stride = x1 - x0, y1 - y0, x1 - x0
+                    info.update(cropped=True, width=width, height=height)
+                    changed = True
+        if mode == 'bilevel':
+            samples = samples.translate(_threshold_table(threshold, 0, 255))
+            changed = True
+        if not changed:
+            return pix
+        reduced = fitz.Pixmap(fitz.csGRAY, width, height, samples, False)
+        reduced.set_dpi(pix.xres, pix.yres)
+        return reduced
+
+    def stats(self):
+        with self._lock:
+            return {'pages': self.pages, 'unreduced_bytes': self.unreduced_bytes, 'bytes': self.encoded_bytes,
+                    'saved_bytes': self.unreduced_bytes - self.encoded_bytes if self.unreduced_bytes else 0}
+
+# Born-digital pages already carry their text. It is used in place of OCR when
+# there is enough of it and it decodes to real characters: fonts without a
+# Unicode mapping come out as control, private-use or replacement characters.
+TEXT_LAYER_MIN_CHARS = 20
+TEXT_LAYER_SCAN_MIN_CHARS = 200  # pages mostly covered by images need a real body of text
+TEXT_LAYER_MIN_WORD_SHARE = 0.6  # letters, combining marks and digits among the non-space characters
+WORD_CHAR_CATEGORIES = 'LMN'  # first letter of the Unicode categories: letters, marks, numbers
+TEXT_LAYER_MAX_BAD_SHARE = 0.02
+BAD_CHAR_CATEGORIES = ('Cc', 'Co', 'Cn', 'Cs')
+
+def image_coverage(page):
+    """Fraction of the page area covered by images (overlaps are not subtracted)."""
+    page_area = abs(page.rect)
+    if not page_area:
+        return 0.0
+    covered = sum(abs(fitz.Rect(image['bbox']) & page.rect) for image in page.get_image_info())
+    return min(covered / page_area, 1.0)
+
+def usable_text_layer(page):
+    """Return the page's embedded text if it can stand in for OCR, else None."""
+    text = page.get_text('text')
+    chars = [c for c in text if not c.isspace()]
+    if len(chars) < TEXT_LAYER_MIN_CHARS:
+        return None
+    if len(chars) < TEXT_LAYER_SCAN_MIN_CHARS and image_coverage(page) >= 0.5:
+        return None
+    bad = sum(1 for c in chars if c == '\ufffd' or unicodedata.category(c) in BAD_CHAR_CATEGORIES)
+    # Marks count with letters: vowel signs and viramas are a large share of
+    # Indic text, and isalnum() is False for them.
+    words = sum(1 for c in chars if unicodedata.category(c)[0] in WORD_CHAR_CATEGORIES)
+    if bad > TEXT_LAYER_MAX_BAD_SHARE * len(chars) or words < TEXT_LAYER_MIN_WORD_SHARE * len(chars):
+        return None
+    return text
+
+class PageResult:
+    """Outcome of OCR for one document page; ``error`` is None on success."""
+
+    def __init__(self, page_num, text=None, error=None, cached=False, elapsed=0.0, timings=None, image=None,
+                 native=False):
+        self.page_num = page_num
+        self.text = text
+        self.error = error
+        self.cached = cached
+        self.native = native  # taken from the PDF's own text layer, not OCR
+        self.elapsed = elapsed
+        self.timings = timings or {}  # stage -> seconds
+        self.image = image or {}  # what PagePreprocessor made of the page: dpi, mode, size, bytes
+
+    @property
+    def ok(self):
+        return self.error is None
+
+# Batched uploads: several page images go to the backend as one PDF, each page
+# headed by a marker line, and the exported text is split back into pages at
+# the markers. This saves the create/export/delete round trips of all but one
+# page. Drive only OCRs the first ten pages of a PDF.
+DEFAULT_OCR_BATCH_PAGES = 1
+MAX_OCR_BATCH_PAGES = 10
+MARKER_BAND = 36  # points above each page image holding its marker
+MARKER_PATTERN = re.compile(r'R\s*E\s*X\s*M\s*I\s+P\s*A\s*G\s*E\s+(\d+)\s+O\s*F\s+(\d+)', re.IGNORECASE)
+OCR_FAILED = "OCR process failed. Check the logs for more information."
+
+def page_marker(index, count):
+    return f"REXMI PAGE {index} OF {count}"
+
+def build_batch_pdf(images):
+    """A PDF with one page per (png_bytes, image_info), each under its page marker."""
+    doc = fitz.open()
+    for index, (image_data, info) in enumerate(images, 1):
+        scale = 72.0 / (info['dpi'] or 72)
+        # Whole points: fractional sizes leave rounding residue that MuPDF writes in exponent form.
+        width, height = round(info['width'] * scale), round(info['height'] * scale)
+        page = doc.new_page(width=max(width, 200), height=height + MARKER_BAND)
+        page.insert_text((12, MARKER_BAND * 0.65), page_marker(index, len(images)), fontsize=14, fontname='helv')
+        page.insert_image(fitz.Rect(0, MARKER_BAND, width, MARKER_BAND + height), stream=image_data)
+    data = doc.tobytes(deflate=True)
+    doc.close()
+    return data
+
+def split_batch_text(text, count):
+    """Per-page texts of a batch export, or None unless markers 1..count each appear once, in order."""
+    matches = list(MARKER_PATTERN.finditer(text))
+    if [(int(m.group(1)), int(m.group(2))) for m in matches] != [(i, count) for i in range(1, count + 1)]:
+        return None
+    if text[:matches[0].start()].replace('\ufeff', '').strip():
+        return None
+    ends = [m.start() for m in matches[1:]] + [len(text)]
+    return [text[m.end():end] for m, end in zip(matches, ends)]
+
+def _load(doc, page_num, lock, preprocessor, text_layer, progress):
+    """Classify one page and, unless its text layer will do, render it: (native_text, pixmap)."""
+    progress('classify')
+    with lock:
+        page = doc.load_page(page_num)
+        native_text = usable_text_layer(page) if text_layer else None
+        if native_text is not None:
+            metrics.incr('text_layer_pages_total')
+            return native_text, None
+        progress('render')
+        return None, preprocessor.render(page)
+
+def _encode(pix, preprocessor, progress):
+    """Preprocess and encode a rendered page: (png_bytes, image_info)."""
+    progress('preprocess')
+    pix, image_info = preprocessor.prepare(pix)
+    progress('encode')
+    image_data = preprocessor.encode(pix, image_info)
+    progress('encode', 1.0)
+    if 'unreduced_bytes' in image_info:
+        metrics.incr('image_unreduced_bytes_total', image_info['unreduced_bytes'])
+    metrics.incr('image_bytes_total', image_info['bytes'])
+    return image_data, image_info
+
+def _lookup(image_data, page_num, backend, cache, preprocessor, progress):
+    """Return (cache_key, cached text or None)."""
+    progress('cache')
+    if not cache:
+        return None, None
+    # Everything that changes what comes back for this image is part of the key.
+    settings = dict(backend.cache_settings(), preprocess=preprocessor.cache_settings())
+    cache_key = OCRCache.make_key(image_data, settings)
+    text = cache.get(cache_key)
+    if text is not None:
+        logger.info(f"OCR cache hit for page {page_num}")
+        metrics.incr('cache_hits_total')
+    else:
+        metrics.incr('cache_misses_total')
+    return cache_key, text
+
+def _text_result(page_num, text, cache, cache_key, progress, cached=False):
+    """PageResult for text from the backend or the cache (None meaning the backend failed)."""
+    if text is None:
+        return PageResult(page_num, error=OCR_FAILED)
+    if cache and not cached:
+        progress('cache')
+        cache.put(cache_key, text)
+    progress('clean')
+    return PageResult(page_num, clean_text(text), cached=cached)
+
+def ocr_page(doc, page_num, backend, cache=None, progress=None, lock=None, preprocessor=None, text_layer=True):
+    """Render, OCR and clean one document page (0-based).
+
+    With ``text_layer`` a page whose embedded text is usable is returned from
+    that text and never rendered. ``lock`` guards access to ``doc`` when
+    several threads share it. Failures are returned in the result rather than
+    raised, so a bad page never stops a batch.
+    """
+    start = time.monotonic()
+    if progress is None:
+        progress = PipelineProgress()
+    if lock is None:
+        lock = threading.Lock()
+    if preprocessor is None:
+        preprocessor = PagePreprocessor()
+    image_info = {}
+    try:
+        native_text, pix = _load(doc, page_num, lock, preprocessor, text_layer, progress)
+        if native_text is not None:
+            result = PageResult(page_num, clean_text(native_text), native=True)
+        else:
+            image_data, image_info = _encode(pix, preprocessor, progress)
+            del pix
+            cache_key, text = _lookup(image_data, page_num, backend, cache, preprocessor, progress)
+            cached = text is not None
+            if not cached:
+                text = backend.recognize(image_data, 'image/png', progress)
+            result = _text_result(page_num, text, cache, cache_key, progress, cached)
+        if result.ok:
+            progress.done()
+    except Exception as e:
+        result = PageResult(page_num, error=f"An error occurred: {str(e)}")
+    progress.finish()
+    end = time.monotonic()
+    result.elapsed = end - start
+    result.timings = progress.timings
+    result.image = image_info
+    metrics.record_page(result, progress.spans, start, end, document=getattr(doc, 'name', ''))
+    return result
+
+def ocr_pages(doc, page_nums, backend, cache=None, progress=None, lock=None, preprocessor=None, text_layer=True):
+    """OCR several pages (0-based, ideally consecutive) with one backend upload.
+
+    Pages served by their text layer or the cache are left out of the upload;
+    the rest go to the backend together as one batch PDF. If the exported
+    text cannot be split back into pages at the markers, those pages are sent
+    one at a time instead. Returns a PageResult per page, in order; elapsed
+    time and stage timings are those of the whole batch.
+    """
+    if len(page_nums) == 1:
+        return [ocr_page(doc, page_nums[0], backend, cache, progress, lock, preprocessor, text_layer)]
+    start = time.monotonic()
+    if progress is None:
+        progress = PipelineProgress()
+    if lock is None:
+        lock = threading.Lock()
+    if preprocessor is None:
+        preprocessor = PagePreprocessor()
+    results = {}
+    images = {page_num: {} for page_num in page_nums}
+    pending = []  # (page_num, image_data, cache_key) of pages that need the backend
+    for page_num in page_nums:
+        try:
+            native_text, pix = _load(doc, page_num, lock, preprocessor, text_layer, progress)
+            if native_text is not None:
+                results[page_num] = PageResult(page_num, clean_text(native_text), native=True)
+                continue
+            image_data, images[page_num] = _encode(pix, preprocessor, progress)
+            del pix
+            cache_key, text = _lookup(image_data, page_num, backend, cache, preprocessor, progress)
+            if text is not None:
+                results[page_num] = _text_result(page_num, text, cache, cache_key, progress, cached=True)
+            else:
+                pending.append((page_num, image_data, cache_key))
+        except Exception as e:
+            results[page_num] = PageResult(page_num, error=f"An error occurred: {str(e)}")
+
+    texts = None
+    if len(pending) > 1:
+        try:
+            progress('encode')
+            batch = build_batch_pdf([(image_data, images[page_num]) for page_num, image_data, _ in pending])
+            metrics.incr('batches_total')
+            batch_text = backend.recognize(batch, 'application/pdf', progress)
+            if batch_text is None:
+                texts = [None] * len(pending)
+            else:
+                texts = split_batch_text(batch_text, len(pending))
+                if texts is None:
+                    logger.warning(f"Could not split the OCR text of pages {[p for p, _, _ in pending]}; "
+                                   f"sending them one at a time")
+                    metrics.incr('batch_fallbacks_total')
+        except Exception as e:
+            logger.error(f"Batch upload failed, sending pages one at a time: {str(e)}")
+            metrics.incr('batch_fallbacks_total')
+    for index, (page_num, image_data, cache_key) in enumerate(pending):
+        try:
+            text = texts[index] if texts is not None else backend.recognize(image_data, 'image/png', progress)
+            results[page_num] = _text_result(page_num, text, cache, cache_key, progress)
+        except Exception as e:
+            results[page_num] = PageResult(page_num, error=f"An error occurred: {str(e)}")
+
+    ordered = [results[page_num] for page_num in page_nums]
+    if all(result.ok for result in ordered):
+        progress.done()
+    progress.finish()
+    end = time.monotonic()
+    for index, result in enumerate(ordered):
+        result.elapsed = end - start
+        result.timings = progress.timings
+        result.image = images[result.page_num]
+        # The batch's stages are recorded once, with its first page.
+        spans = progress.spans if index == 0 else ()
+        metrics.record_page(result, spans, start, end, document=getattr(doc, 'name', ''))
+    return ordered
@@ -0,0 +1,226 @@
+"""Full-text search over the OCR text of every document and project.
+
+One SQLite FTS5 index (DATA_DIR/search.sqlite) holds the text of every page
+the app or the batch command line has produced, keyed by document and page.
+A PDF is keyed by its SHA-256, as for job manifests; a project by its own id
+(see project_key), so projects made from the same PDF stay apart. Pages are
+updated one at a time as they are OCR'd or edited, so the index is always
+current and a query over tens of thousands of pages answers in milliseconds.
+
+    python ocr_search.py "land revenue"
+    python ocr_search.py --add a.rexmi --add b.rexmi "land revenue"
+"""
+import argparse
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+
+from ocr_pipeline import DATA_DIR
+from project_store import ProjectStore, is_legacy_project, load_legacy_project
+
+SEARCH_INDEX_PATH = os.path.join(DATA_DIR, 'search.sqlite')
+DEFAULT_SEARCH_LIMIT = 50
+SNIPPET_TOKENS = 12
+
+# Page rows live at rowid document id * PAGE_ROWS + page, so one page or all
+# pages of a document are found through the rowid without a table scan.
+PAGE_ROWS = 1 << 20
+# Projects key their pages like the viewer, behind its blank initial page (gui_ocr.BLANK_PAGES).
+PROJECT_PAGE_OFFSET = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    key TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    path TEXT NOT NULL,
+    updated REAL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS pages USING fts5(text, tokenize = 'unicode61 remove_diacritics 2');
+"""
+
+def project_key(project_id):
+    """Search key of a project, from ProjectStore.project_id."""
+    return 'project:' + project_id
+
+def legacy_project_key(file_path):
+    """Search key of an old JSON project, which has no id: its path, until it is saved again."""
+    return project_key(os.path.abspath(file_path))
+
+TERM_PATTERN = re.compile(r'"([^"]*)"|(\S+)')
+
+def fts_query(text):
+    """An FTS5 query matching every word and "quoted phrase" of plain user input; the last word is a prefix."""
+    terms = []
+    for phrase, word in TERM_PATTERN.findall(text):
+        term = (phrase or word).strip()
+        if term:
+            terms.append('"' + term.replace('"', '""') + '"')
+    if terms and not text.rstrip().endswith('"'):
+        terms[-1] += '*'  # so results keep up while a word is still being typed
+    return ' '.join(terms)
+
+class SearchHit:
+    """One matching page; ``page`` is 0-based and ``snippet`` has the matches bracketed."""
+
+    def __init__(self, key, name, path, page, snippet):
+        self.key = key
+        self.name = name
+        self.path = path
+        self.page = page
+        self.snippet = snippet
+
+    def to_dict(self):
+        return {'document': self.name, 'path': self.path, 'page': self.page + 1, 'snippet': self.snippet}
+
+class SearchIndex:
+    """Open handle on the search index. Use from one thread."""
+
+    def __init__(self, path=SEARCH_INDEX_PATH):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode = WAL')
+        self.conn.execute('PRAGMA synchronous = NORMAL')
+        with self.conn:
+            self.conn.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def document(self, key, path):
+        """The id of the document with this key, now found at path (a PDF or a project).
+
+        Whatever was indexed at path under another key is dropped: the file
+        there was replaced, or converted from an old project.
+        """
+        path = os.path.abspath(path)
+        with self.conn:
+            for stale_id, in self.conn.execute('SELECT id FROM documents WHERE path = ? AND key != ?',
+                                               (path, key)).fetchall():
+                self._delete(stale_id)
+            self.conn.execute('INSERT INTO documents (key, name, path, updated) VALUES (?, ?, ?, ?) '
+                              'ON CONFLICT (key) DO UPDATE SET name = excluded.name, path = excluded.path',
+                              (key, os.path.basename(path), path, time.time()))
+        return self.conn.execute('SELECT id FROM documents WHERE key = ?', (key,)).fetchone()[0]
+
+    def remove_document(self, key):
+        """Drop the document with this key and all its pages, if it is indexed."""
+        with self.conn:
+            row = self.conn.execute('SELECT id FROM documents WHERE key = ?', (key,)).fetchone()
+            if row is not None:
+                self._delete(row[0])
+
+    def _delete(self, document_id):
+        self.conn.execute('DELETE FROM pages WHERE rowid >= ? AND rowid < ?',
+                          (document_id * PAGE_ROWS, (document_id + 1) * PAGE_ROWS))
+        self.conn.execute('DELETE FROM documents WHERE id = ?', (document_id,))
+
+    def document_pages(self, key):
+        """{page: text} of every indexed page of the document with this key (0-based)."""
+        row = self.conn.execute('SELECT id FROM documents WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return {}
+        return {rowid % PAGE_ROWS: text for rowid, text in self.conn.execute(
+            'SELECT rowid, text FROM pages WHERE rowid >= ? AND rowid < ?',
+            (row[0] * PAGE_ROWS, (row[0] + 1) * PAGE_ROWS))}
+
+    def update_pages(self, document_id, pages):
+        """Store the text of the given pages ({page: text}, 0-based); empty text removes a page."""
+        rows = [(document_id * PAGE_ROWS + page, text) for page, text in pages.items()]
+        with self.conn:
+            self.conn.executemany('DELETE FROM pages WHERE rowid = ?', ((rowid,) for rowid, _ in rows))
+            self.conn.executemany('INSERT INTO pages (rowid, text) VALUES (?, ?)',
+                                  ((rowid, text) for rowid, text in rows if text and text.strip()))
+            self.conn.execute('UPDATE documents SET updated = ? WHERE id = ?', (time.time(), document_id))
+
+    def update_page(self, document_id, page, text):
+        self.update_pages(document_id, {page: text})
+
+    def clear_document(self, document_id):
+        """Remove every page of a document."""
+        with self.conn:
+            self.conn.execute('DELETE FROM pages WHERE rowid >= ? AND rowid < ?',
+                              (document_id * PAGE_ROWS, (document_id + 1) * PAGE_ROWS))
+
+    def replace_document(self, document_id, pages):
+        """Make the document's indexed pages exactly pages ({page: text})."""
+        self.clear_document(document_id)
+        self.update_pages(document_id, pages)
+
+    def search(self, query, limit=DEFAULT_SEARCH_LIMIT):
+        """Best matches first for plain user input (see fts_query)."""
+        match = fts_query(query)
+        if not match:
+            return []
+        rows = self.conn.execute(
+            f"SELECT d.key, d.name, d.path, p.rowid % {PAGE_ROWS}, "
+            f"snippet(pages, 0, '[', ']', '...', {SNIPPET_TOKENS}) "
+            f"FROM pages AS p JOIN documents AS d ON d.id = p.rowid / {PAGE_ROWS} "
+            f"WHERE pages MATCH ? ORDER BY rank LIMIT ?", (match, limit))
+        return [SearchHit(*row) for row in rows]
+
+    def page_count(self):
+        return self.conn.execute('SELECT COUNT(*) FROM pages').fetchone()[0]
+
+def index_project(index, file_path):
+    """Index every page of a .rexmi project; returns the number of pages."""
+    if is_legacy_project(file_path):
+        _, ocr_results = load_legacy_project(file_path)
+        key = legacy_project_key(file_path)
+    else:
+        with ProjectStore(file_path) as store:
+            ocr_results = store.load_pages()
+            key = project_key(store.project_id())
+    pages = {int(page) - PROJECT_PAGE_OFFSET: text for page, text in ocr_results.items()
+             if int(page) >= PROJECT_PAGE_OFFSET}
+    index.replace_document(index.document(key, file_path), pages)
+    return len(pages)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Search the OCR text of every document and project.")
+    parser.add_argument('query', nargs='?', help='words and "quoted phrases" to find')
+    parser.add_argument('--add', action='append', metavar='PROJECT',
+                        help="index this .rexmi project first (repeat for more)")
+    parser.add_argument('-n', '--limit', type=int, default=DEFAULT_SEARCH_LIMIT, help="most hits to show")
+    parser.add_argument('--json', action='store_true', help="print hits as JSON lines")
+    parser.add_argument('--index', default=SEARCH_INDEX_PATH, help="search index file")
+    args = parser.parse_args(argv)
+    if not args.query and not args.add:
+        parser.error("give a query, --add, or both")
+
+    failed = 0
+    hits = []
+    with SearchIndex(args.index) as index:
+        for path in args.add or ():
+            try:
+                print(f"Indexed {index_project(index, path)} pages of {path}", file=sys.stderr)
+            except (OSError, ValueError, sqlite3.Error) as e:
+                print(f"Could not index {path}: {str(e)}", file=sys.stderr)
+                failed += 1
+        if not args.query:
+            return 2 if failed else 0
+        start = time.perf_counter()
+        hits = index.search(args.query, args.limit)
+        elapsed = time.perf_counter() - start
+        for hit in hits:
+            if args.json:
+                print(json.dumps(hit.to_dict(), ensure_ascii=False))
+            else:
+                print(f"{hit.path}:{hit.page + 1}: {hit.snippet}")
+        print(f"{len(hits)} hits in {elapsed * 1000:.1f} ms ({index.page_count()} pages indexed)", file=sys.stderr)
+    if failed:
+        return 2
+    return 0 if hits else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,263 @@
+"""Reading and writing .rexmi OCR projects.
+
+A project is a single SQLite file holding the raw PDF bytes once and the OCR
+text of every page as its own row, so saving an edited project only rewrites
+the pages that changed. Projects written by older versions were one JSON
+document with the PDF base64-encoded inside; those are still read by
+``load_legacy_project`` and are converted on the next save.
+
+Edits made since the last save are appended to a journal next to the project
+(``<project>.journal``, JSON lines) as they happen, replayed when the project
+is opened again and dropped once they are saved. Every save gives the project
+a new revision and the journal records the revision it applies to, so a
+journal that outlived its save is never replayed twice.
+
+Each project also has a random id of its own, kept across saves, so two
+projects made from the same PDF stay two documents (in the search index).
+"""
+import base64
+import contextlib
+import json
+import os
+import sqlite3
+import time
+import uuid
+
+SQLITE_MAGIC = b'SQLite format 3\x00'
+PROJECT_FORMAT_VERSION = 2
+JOURNAL_SUFFIX = '.journal'
+JOURNAL_VERSION = 1
+JOURNAL_SYNC_INTERVAL = 5.0  # seconds; entries are flushed at once, fsynced at most this often
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS pdf (id INTEGER PRIMARY KEY CHECK (id = 0), data BLOB NOT NULL);
+CREATE TABLE IF NOT EXISTS pages (page INTEGER PRIMARY KEY, text TEXT NOT NULL);
+"""
+
+def is_legacy_project(file_path):
+    """True for the old base64-in-JSON .rexmi files."""
+    with open(file_path, 'rb') as f:
+        return f.read(len(SQLITE_MAGIC)) != SQLITE_MAGIC
+
+def load_legacy_project(file_path):
+    """Return (pdf_bytes, ocr_results) from an old JSON project."""
+    with open(file_path, 'r') as f:
+        project_data = json.load(f)
+    pdf_bytes = base64.b64decode(project_data.pop('pdf_content'))
+    return pdf_bytes, project_data['ocr_results']
+
+class ProjectStore:
+    """Open handle on a SQLite project file. Use as a context manager."""
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.conn = sqlite3.connect(file_path)
+        self.conn.execute('PRAGMA synchronous = NORMAL')
+        with self.conn:
+            self.conn.executescript(SCHEMA)
+            self.conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('format_version', ?)",
+                              (str(PROJECT_FORMAT_VERSION),))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def write_pdf(self, pdf_bytes):
+        with self.conn:
+            self.conn.execute('INSERT OR REPLACE INTO pdf (id, data) VALUES (0, ?)', (sqlite3.Binary(pdf_bytes),))
+
+    def read_pdf(self):
+        row = self.conn.execute('SELECT data FROM pdf WHERE id = 0').fetchone()
+        if row is None:
+            raise ValueError(f"{self.file_path} does not contain a PDF")
+        return bytes(row[0])
+
+    def save_pages(self, pages, removed=()):
+        """Write only the given pages ({page: text}) and drop the removed ones, in one transaction.
+
+        Returns the project's new revision.
+        """
+        revision = uuid.uuid4().hex
+        with self.conn:
+            self.conn.executemany('INSERT OR REPLACE INTO pages (page, text) VALUES (?, ?)',
+                                  ((int(page), text) for page, text in pages.items()))
+            self.conn.executemany('DELETE FROM pages WHERE page = ?', ((int(page),) for page in removed))
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('revision', ?)", (revision,))
+        return revision
+
+    def project_id(self):
+        """The project's id, given one now if it was written before projects had ids."""
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'project_id'").fetchone()
+        if row:
+            return row[0]
+        project_id = uuid.uuid4().hex
+        self.set_project_id(project_id)
+        return project_id
+
+    def set_project_id(self, project_id):
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('project_id', ?)", (project_id,))
+
+    def revision(self):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'revision'").fetchone()
+        return row[0] if row else None
+
+    def load_pages(self):
+        """Return every page's text keyed like OCRApp.ocr_results (page number as a string)."""
+        return {str(page): text for page, text in self.conn.execute('SELECT page, text FROM pages')}
+
+def write_project(file_path, pdf_bytes, ocr_results, project_id=None):
+    """Write a complete project, replacing whatever is at file_path only once it is fully written.
+
+    Rewriting an existing project should pass its project_id to keep it; a new
+    project gets a new one. Returns (project_id, revision).
+    """
+    temp_path = file_path + '.tmp'
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(temp_path)
+    with ProjectStore(temp_path) as store:
+        store.write_pdf(pdf_bytes)
+        project_id = project_id or uuid.uuid4().hex
+        store.set_project_id(project_id)
+        revision = store.save_pages(ocr_results)
+    os.replace(temp_path, file_path)
+    return project_id, revision
+
+def _common_affixes(old, new):
+    """Lengths of the common prefix and (non-overlapping) common suffix of two strings."""
+    # Binary search on slice comparisons keeps this at C speed for long pages.
+    low, high = 0, min(len(old), len(new))
+    while low < high:
+        mid = (low + high + 1) // 2
+        if old[:mid] == new[:mid]:
+            low = mid
+        else:
+            high = mid - 1
+    prefix = low
+    low, high = 0, min(len(old), len(new)) - prefix
+    while low < high:
+        mid = (low + high + 1) // 2
+        if old[len(old) - mid:] == new[len(new) - mid:]:
+            low = mid
+        else:
+            high = mid - 1
+    return prefix, low
+
+class ProjectJournal:
+    """Append-only log of page text changes since the project was last saved.
+
+    Entries are one JSON object per line: a page's full text
+    (``{"page": "3", "text": ...}``), an edit within it (``{"page": "3",
+    "at": 120, "cut": 2, "ins": "..."}``) or the removal of every page
+    (``{"clear": true}``). The first line names the project revision the
+    entries apply to. Use ``open`` after loading a project and ``start``
+    after saving one.
+    """
+
+    def __init__(self, project_path, revision, fresh):
+        self.path = project_path + JOURNAL_SUFFIX
+        self.revision = revision
+        self.file = open(self.path, 'w' if fresh else 'a', encoding='utf-8')
+        self.synced = time.monotonic()
+        if fresh:
+            self._write({'journal': JOURNAL_VERSION, 'revision': revision})
+
+    @classmethod
+    def start(cls, project_path, revision):
+        """An empty journal for a project just saved at ``revision``."""
+        return cls(project_path, revision, fresh=True)
+
+    @classmethod
+    def open(cls, project_path, revision, pages):
+        """Replay a journal left for ``revision`` into pages ({page: text}) and continue it.
+
+        Returns (journal, keys of the recovered pages). A journal written for
+        another revision is out of date and is started afresh.
+        """
+        journal_path = project_path + JOURNAL_SUFFIX
+        recovered = cls.replay(journal_path, revision, pages)
+        if recovered is None:
+            return cls.start(project_path, revision), set()
+        # Compact what was recovered into a new journal (full page texts), so a
+        # line torn by the crash never ends up in the middle of the file.
+        entries = [{'journal': JOURNAL_VERSION, 'revision': revision}]
+        if any(page not in pages for page in recovered):
+            entries.append({'clear': True})
+            recovered = set(pages) | recovered
+        entries.extend({'page': page, 'text': pages[page]} for page in sorted(recovered, key=int) if page in pages)
+        temp_path = journal_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.writelines(json.dumps(entry, ensure_ascii=False) + '\n' for entry in entries)
+        os.replace(temp_path, journal_path)
+        return cls(project_path, revision, fresh=False), recovered
+
+    @staticmethod
+    def replay(journal_path, revision, pages):
+        """Apply the journal's entries to pages; returns the changed keys, or None if it does not apply."""
+        try:
+            with open(journal_path, 'r', encoding='utf-8') as f:
+                lines = f.read().splitlines()
+        except FileNotFoundError:
+            return None
+        try:
+            header = json.loads(lines[0])
+        except (IndexError, ValueError):
+            return None
+        if header.get('journal') != JOURNAL_VERSION or header.get('revision') != revision:
+            return None
+        changed = set()
+        for line in lines[1:]:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                break  # a line cut short by a crash; nothing after it was written
+            if entry.get('clear'):
+                changed.update(pages)
+                pages.clear()
+                continue
+            page = entry['page']
+            if 'text' in entry:
+                pages[page] = entry['text']
+            else:
+                text = pages.get(page, '')
+                at, cut = entry['at'], entry['cut']
+                if at + cut > len(text):
+                    break  # the journal does not match this text; keep what applied cleanly
+                pages[page] = text[:at] + entry['ins'] + text[at + cut:]
+            changed.add(page)
+        return changed
+
+    def record(self, page, old, new):
+        """Log that page's text went from old (None if it had none) to new."""
+        if old is None:
+            self._write({'page': page, 'text': new})
+            return
+        prefix, suffix = _common_affixes(old, new)
+        self._write({'page': page, 'at': prefix, 'cut': len(old) - prefix - suffix,
+                     'ins': new[prefix:len(new) - suffix]})
+
+    def record_clear(self):
+        self._write({'clear': True})
+
+    def _write(self, entry):
+        self.file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        self.file.flush()
+        now = time.monotonic()
+        if now - self.synced >= JOURNAL_SYNC_INTERVAL:
+            os.fsync(self.file.fileno())
+            self.synced = now
+
+    def close(self):
+        self.file.close()
+
+    def discard(self):
+        """Close and delete the journal, once everything in it is saved."""
+        self.close()
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self.path)